@@ -1,36 +1,293 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from core.chatbot import FinancialChatbot
+import time
 
-from dotenv import load_dotenv 
-import os 
+_import_started = time.perf_counter()
+
+import asyncio
+import json
+import logging
+import os
+import threading
+from contextlib import asynccontextmanager
+from typing import Annotated, Literal
+
+from dotenv import load_dotenv
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
+from core.metrics import REGISTRY
+from llm.transport import LLMOverloaded
 
 load_dotenv()
 
-app = FastAPI()
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
+
+DB_PATH = os.getenv("DB_PATH", "data/processed/financial_data.db")
+
+# Request size limits for /ask/batch
+MAX_BATCH_QUESTIONS = 100
+MAX_QUESTION_CHARS = 1000
+
+
+class Startup:
+    """Builds and warms the chatbot once per process and times it.
+
+    Importing this module stays cheap: pandas, DuckDB and huggingface_hub
+    are only imported by `load()`, which the lifespan runs in a thread after
+    the server is already answering liveness probes.
+    """
+
+    def __init__(self):
+        self.chatbot = None
+        self.task = None
+        self.error = None
+        self.import_seconds = None
+        self.startup_seconds = None
+        self.warmup = None
+        self.started_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def load(self, db_path=None):
+        """Build and warm the chatbot over `db_path` (default DB_PATH) if not done yet."""
+        with self._lock:
+            if self.chatbot is None:
+                started = time.perf_counter()
+                from core.chatbot import FinancialChatbot
+
+                chatbot = FinancialChatbot(api_key=os.getenv("HF_API_TOKEN"), db_path=db_path or DB_PATH)
+                self.warmup = chatbot.warm_up()
+                self.startup_seconds = round(time.perf_counter() - started, 4)
+                self.chatbot = chatbot
+                self.error = None
+                logger.info("Chatbot ready in %.2fs (warm-up %s)", self.startup_seconds, self.warmup)
+        return self.chatbot
+
+    def start(self):
+        """Start `load()` in the background unless it is running or done."""
+        if self.task is None or (self.task.done() and self.task.exception() is not None):
+            self.task = asyncio.ensure_future(asyncio.to_thread(self.load))
+            self.task.add_done_callback(self._done)
+        return self.task
+
+    def _done(self, task):
+        if not task.cancelled() and task.exception() is not None:
+            self.error = str(task.exception())
+            logger.error("Chatbot failed to start: %s", self.error)
 
-# Initialize chatbot
-chatbot = FinancialChatbot(
-    api_key=os.getenv('HF_API_TOKEN'),
-    db_path='data/processed/financial_data.db'
-)
+    def collect_metrics(self):
+        return [
+            ("app_import_seconds", "Time to import the API module", None, self.import_seconds or 0),
+            ("app_startup_seconds", "Time to build and warm the chatbot", None, self.startup_seconds or 0),
+            ("app_ready", "1 once the chatbot is warm", None, int(self.chatbot is not None)),
+        ]
 
 
+startup = Startup()
+REGISTRY.register_collector(startup.collect_metrics)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    startup.start()
+    yield
+    if startup.chatbot is not None:
+        startup.chatbot.close()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+async def get_chatbot():
+    """The warm chatbot; requests that arrive during start-up wait for it."""
+    if startup.chatbot is not None:
+        return startup.chatbot
+    try:
+        return await asyncio.shield(startup.start())
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Chatbot is not available: {e}")
+
 
 class Question(BaseModel):
     question: str
+    # Any client-chosen id; questions with the same id are one conversation
+    session_id: str | None = Field(default=None, max_length=64)
+
+class BatchQuestions(BaseModel):
+    questions: list[Annotated[str, Field(max_length=MAX_QUESTION_CHARS)]] = Field(
+        min_length=1, max_length=MAX_BATCH_QUESTIONS
+    )
+    concurrency: int = Field(default=8, ge=1, le=32)
+
+def _overloaded(error):
+    # Shed load quickly instead of queueing behind a saturated LLM
+    return HTTPException(status_code=429, detail=str(error), headers={"Retry-After": str(error.retry_after)})
 
 @app.post("/ask")
-async def ask_question(q: Question):
+async def ask_question(q: Question, chatbot=Depends(get_chatbot)):
+    try:
+        answer = await chatbot.answer_async(q.question, session_id=q.session_id)
+        if q.session_id is None:
+            return {"answer": answer}
+        return {"answer": answer, "session_id": q.session_id}
+    except LLMOverloaded as e:
+        raise _overloaded(e)
+    except Exception as e:
+        logger.exception("Failed to answer question")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/ask/batch")
+async def ask_batch(batch: BatchQuestions, chatbot=Depends(get_chatbot)):
     try:
-        answer = chatbot.answer(q.question)
-        return {"answer": answer}
+        items = await chatbot.answer_batch(batch.questions, concurrency=batch.concurrency)
+        return {
+            "answers": items,
+            "unique_sql": len({item["sql"] for item in items if item["sql"]}),
+        }
+    except LLMOverloaded as e:
+        raise _overloaded(e)
     except Exception as e:
-        print(e)
+        logger.exception("Failed to answer question")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/ask/stream")
+async def ask_question_stream(q: Question, chatbot=Depends(get_chatbot)):
+    async def events():
+        try:
+            async for event, payload in chatbot.stream_answer(q.question, session_id=q.session_id):
+                yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+        except LLMOverloaded as e:
+            yield f"event: error\ndata: {json.dumps({'detail': str(e), 'status': 429})}\n\n"
+        except Exception as e:
+            logger.exception("Failed to stream answer")
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.delete("/sessions/{session_id}")
+async def end_session(session_id: str, chatbot=Depends(get_chatbot)):
+    # Sessions also expire when idle; this frees one straight away
+    if not chatbot.sessions.drop(session_id):
+        raise HTTPException(status_code=404, detail="Unknown session")
+    return {"session_id": session_id, "ended": True}
+
+# Query parameters of /tables/{table}; any other parameter is a column filter
+BROWSE_PARAMS = {"columns", "limit", "offset", "after", "count", "format"}
+
+@app.get("/tables/{table}")
+async def browse_table(
+    table: Literal["holdings", "trades"],
+    request: Request,
+    columns: str | None = None,
+    limit: int = 100,
+    offset: int = 0,
+    after: int | None = None,
+    count: bool = False,
+    format: Literal["json", "arrow"] = "json",
+    chatbot=Depends(get_chatbot),
+):
+    """Page through a base table, e.g.
+    /tables/holdings?columns=PortfolioName,SecName,MV_Base&PortfolioName=Ytum&limit=50
+
+    Pass `next_cursor` from the previous page as `after` to get the next one.
+    """
+    filters = {key: value for key, value in request.query_params.items() if key not in BROWSE_PARAMS}
+    page = await chatbot.executor.browse_async(
+        table,
+        columns=columns.split(",") if columns else None,
+        filters=filters,
+        limit=limit,
+        offset=offset,
+        after=after,
+        count=count,
+    )
+    if page["error"]:
+        raise HTTPException(status_code=400, detail=page["error"])
+
+    data = page["table"]
+    if format == "arrow":
+        import pyarrow as pa
+
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, data.schema) as writer:
+            writer.write_table(data)
+        headers = {"X-Next-Cursor": "" if page["next_cursor"] is None else str(page["next_cursor"])}
+        if page["total"] is not None:
+            headers["X-Total-Rows"] = str(page["total"])
+        return Response(sink.getvalue().to_pybytes(), media_type="application/vnd.apache.arrow.stream", headers=headers)
+
+    # Compact JSON: column names once, then rows as arrays
+    values = [column.to_pylist() for column in data.columns]
+    return {
+        "columns": data.column_names,
+        "rows": [list(row) for row in zip(*values)],
+        "next_cursor": page["next_cursor"],
+        "total": page["total"],
+    }
+
 @app.get("/health")
 async def health():
     return {"status": "healthy"}
 
+@app.get("/health/live")
+async def health_live():
+    # The process is up and serving; says nothing about dependencies
+    return {"status": "alive", "uptime_seconds": round(time.monotonic() - startup.started_at, 1)}
+
+@app.get("/health/ready")
+async def health_ready():
+    """200 once the chatbot is warm and its dependencies respond, else 503."""
+    timings = {
+        "import_seconds": startup.import_seconds,
+        "startup_seconds": startup.startup_seconds,
+        "warmup_seconds": startup.warmup,
+    }
+    chatbot = startup.chatbot
+    if chatbot is None:
+        status = "failed" if startup.error else "starting"
+        return JSONResponse({"status": status, "error": startup.error, "timings": timings}, status_code=503)
+
+    checks = {}
+    # 1. DuckDB answers a query; both calls block, so they run on its threads
+    executor = chatbot.executor
+    try:
+        await asyncio.wait_for(executor.run_async(executor.ping), timeout=2)
+        data_version = await asyncio.wait_for(executor.run_async(executor.data_version), timeout=2)
+        checks["database"] = {"ok": True, "data_version": data_version}
+    except Exception as e:
+        checks["database"] = {"ok": False, "error": str(e) or type(e).__name__}
+
+    # 2. Caches are readable; the LLM cache is SQLite on disk
+    try:
+        llm_stats = None
+        if chatbot.llm_cache:
+            llm_stats = await asyncio.wait_for(asyncio.to_thread(chatbot.llm_cache.stats), timeout=2)
+        checks["cache"] = {
+            "ok": True,
+            "answer_entries": chatbot.cache.stats()["entries"],
+            "llm_entries": llm_stats["entries"] if llm_stats else None,
+        }
+    except Exception as e:
+        checks["cache"] = {"ok": False, "error": str(e) or type(e).__name__}
+
+    # 3. The LLM transport has room in its queue
+    transport = chatbot.llm_transport.stats()
+    checks["llm_transport"] = {"ok": transport["queued"] < transport["max_queue"], **transport}
+
+    ready = all(check["ok"] for check in checks.values())
+    return JSONResponse(
+        {"status": "ready" if ready else "degraded", "checks": checks, "timings": timings},
+        status_code=200 if ready else 503
+    )
+
+@app.get("/metrics")
+async def metrics():
+    # Prometheus text exposition format
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+startup.import_seconds = round(time.perf_counter() - _import_started, 4)
+
 # Run: uvicorn api.main:app --reload
\ No newline at end of file
@@ -0,0 +1,240 @@
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import duckdb
+import psutil
+
+from benchmarks.stub_llm import StubLLM, install
+from core.metrics import QUESTIONS, STAGE_SECONDS
+from database.ingest import DEFAULT_DB_PATH, PROJECT_ROOT
+
+CORPUS_PATH = Path(__file__).resolve().parent / "questions.json"
+
+
+def load_corpus(path=CORPUS_PATH, categories=None):
+    with open(path) as f:
+        corpus = json.load(f)
+    if categories:
+        corpus = [item for item in corpus if item["category"] in categories]
+    return corpus
+
+
+def run_chatbot(chatbot, questions, concurrency):
+    """Call the blocking `FinancialChatbot.answer` from `concurrency` threads."""
+
+    def timed(question):
+        started = time.perf_counter()
+        try:
+            chatbot.answer(question)
+            error = None
+        except Exception as e:
+            error = str(e)
+        return time.perf_counter() - started, error
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(timed, questions))
+
+
+def run_api(app, questions, concurrency, path="/ask"):
+    """POST every question to the FastAPI app in-process, `concurrency` at a time."""
+    import httpx
+
+    async def main():
+        semaphore = asyncio.Semaphore(concurrency)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            async def timed(question):
+                async with semaphore:
+                    started = time.perf_counter()
+                    try:
+                        response = await client.post(path, json={"question": question})
+                        error = None if response.status_code == 200 else f"HTTP {response.status_code}"
+                    except Exception as e:
+                        error = str(e)
+                    return time.perf_counter() - started, error
+
+            return await asyncio.gather(*(timed(question) for question in questions))
+
+    return asyncio.run(main())
+
+
+def summarize(timings, wall_seconds, stages_before, sources_before, rss_before):
+    latencies = sorted(seconds for seconds, error in timings if error is None)
+    errors = [error for _, error in timings if error is not None]
+
+    stages = {}
+    for key, (count, total) in STAGE_SECONDS.snapshot().items():
+        count_before, total_before = stages_before.get(key, (0, 0.0))
+        if count > count_before:
+            stages[key[0]] = {
+                "count": count - count_before,
+                "mean_ms": round(1000 * (total - total_before) / (count - count_before), 2),
+                "total_ms": round(1000 * (total - total_before), 2),
+            }
+
+    sources = {}
+    for key, count in QUESTIONS.snapshot().items():
+        if count > sources_before.get(key, 0):
+            sources[key[0]] = count - sources_before.get(key, 0)
+
+    rss = psutil.Process().memory_info().rss
+    return {
+        "requests": len(timings),
+        "errors": len(errors),
+        "error_samples": sorted(set(errors))[:5],
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_rps": round(len(timings) / wall_seconds, 2) if wall_seconds else None,
+        "latency_ms": {
+            "mean": _ms(sum(latencies) / len(latencies)) if latencies else None,
+            "p50": _ms(_percentile(latencies, 50)),
+            "p95": _ms(_percentile(latencies, 95)),
+            "p99": _ms(_percentile(latencies, 99)),
+            "max": _ms(latencies[-1]) if latencies else None,
+        },
+        "stages": stages,
+        "sql_sources": sources,
+        "memory_mb": {
+            "rss_start": round(rss_before / 2**20, 1),
+            "rss_end": round(rss / 2**20, 1),
+        },
+    }
+
+
+def benchmark(target="chatbot", db_path=DEFAULT_DB_PATH, concurrency=(1, 8, 32), rounds=3,
+              latency_ms=400, jitter_ms=100, categories=None, warm_cache=False):
+    """Run the corpus `rounds` times at each concurrency level.
+
+    Caches are cleared before each level unless `warm_cache`; repeated
+    rounds then show how much the caches absorb. Returns a JSON-ready dict.
+    """
+    corpus = load_corpus(categories=categories)
+    questions = [item["question"] for item in corpus] * rounds
+    llm = StubLLM.from_corpus(corpus, latency_ms=latency_ms, jitter_ms=jitter_ms)
+
+    # 1. Build the system under test with the stub LLM
+    started = time.perf_counter()
+    if target == "api":
+        import api.main
+        app = api.main.app
+        chatbot = api.main.startup.load(str(db_path))
+    else:
+        from core.chatbot import FinancialChatbot
+        chatbot = FinancialChatbot(api_key=None, db_path=str(db_path))
+    startup_seconds = time.perf_counter() - started
+    install(chatbot, llm)
+
+    # 2. One run per concurrency level
+    levels = []
+    for level in concurrency:
+        if not warm_cache:
+            chatbot.cache.clear()
+            chatbot.sql_cache.clear()
+            if chatbot.executor.results is not None:
+                chatbot.executor.results.clear()
+        stages_before = STAGE_SECONDS.snapshot()
+        sources_before = QUESTIONS.snapshot()
+        llm_calls_before = llm.calls
+        rss_before = psutil.Process().memory_info().rss
+
+        started = time.perf_counter()
+        if target == "api":
+            timings = run_api(app, questions, level)
+        else:
+            timings = run_chatbot(chatbot, questions, level)
+        wall_seconds = time.perf_counter() - started
+
+        result = summarize(timings, wall_seconds, stages_before, sources_before, rss_before)
+        result["concurrency"] = level
+        result["llm_calls"] = llm.calls - llm_calls_before
+        levels.append(result)
+        print(
+            f"{target} c={level:<3} {result['throughput_rps']:>8} req/s  "
+            f"p50 {result['latency_ms']['p50']} ms  p95 {result['latency_ms']['p95']} ms  "
+            f"p99 {result['latency_ms']['p99']} ms  errors {result['errors']}"
+        )
+
+    return {
+        "target": target,
+        "commit": _git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "duckdb": duckdb.__version__,
+            "cpus": psutil.cpu_count(),
+        },
+        "config": {
+            "db_path": str(db_path),
+            "questions": len(corpus),
+            "rounds": rounds,
+            "llm_latency_ms": latency_ms,
+            "llm_jitter_ms": jitter_ms,
+            "warm_cache": warm_cache,
+        },
+        "startup_seconds": round(startup_seconds, 3),
+        "results": levels,
+        "caches": {
+            "answer": chatbot.cache.stats(),
+            "sql": chatbot.sql_cache.stats(),
+            "result": chatbot.executor.results.stats() if chatbot.executor.results else None,
+        },
+        "router": chatbot.router.stats(),
+        "coalesced": {"question": chatbot.question_flight.stats(), "sql": chatbot.sql_flight.stats()},
+    }
+
+
+def _percentile(values, percent):
+    # Nearest-rank percentile over sorted values
+    if not values:
+        return None
+    rank = max(1, -(-len(values) * percent // 100))
+    return values[int(rank) - 1]
+
+
+def _ms(seconds):
+    return None if seconds is None else round(1000 * seconds, 2)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the chatbot against a stub LLM.")
+    parser.add_argument("--target", choices=["chatbot", "api"], default="chatbot")
+    parser.add_argument("--db", default=str(DEFAULT_DB_PATH))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--latency-ms", type=float, default=400)
+    parser.add_argument("--jitter-ms", type=float, default=100)
+    parser.add_argument("--category", action="append", help="Only questions in this category (repeatable)")
+    parser.add_argument("--warm-cache", action="store_true", help="Keep caches between concurrency levels")
+    parser.add_argument("--output", help="Write the JSON report here")
+    args = parser.parse_args()
+
+    report = benchmark(
+        target=args.target,
+        db_path=args.db,
+        concurrency=args.concurrency,
+        rounds=args.rounds,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        categories=args.category,
+        warm_cache=args.warm_cache,
+    )
+    output = args.output or f"benchmark_{args.target}_{report['commit'] or 'local'}.json"
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {output}")
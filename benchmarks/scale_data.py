@@ -0,0 +1,252 @@
+import argparse
+import json
+import math
+import statistics
+import time
+from pathlib import Path
+
+import duckdb
+
+from benchmarks.run_benchmark import load_corpus, _git_commit
+from database.create_reference_tables import create_views
+from database.ingest import DEFAULT_DB_PATH, PROJECT_ROOT, SOURCES, create_indexes
+from database.materialize import create_materialized_tables, refresh_summaries
+from database.query_executor import QueryExecutor
+from database.schema_docs import apply_comments
+from llm.sql_router import SQLRouter
+
+DEFAULT_OUTPUT = PROJECT_ROOT / "data" / "benchmark" / "financial_data_scaled.db"
+REFERENCE_VIEWS = ["v_fund_summary", "v_trade_summary", "v_security_summary", "v_data_coverage"]
+
+# Deterministic noise in [0, 1) from a hash of the given expressions, so the
+# same settings always produce the same data
+NOISE = "((hash({}) % 1000000) / 1000000.0)"
+
+
+def scale(source_db=DEFAULT_DB_PATH, output_db=DEFAULT_OUTPUT, funds=10, securities=4, dates=20,
+          memory_limit=None):
+    """Write a scaled copy of holdings and trades to `output_db`.
+
+    Every source row is repeated for `funds` copies of its fund, `securities`
+    copies of its security and `dates` daily snapshots (the source date plus
+    the weekdays before it), so holdings grow by funds * securities * dates.
+    Copies get their own names and ids ("Ytum #2", SecurityId + offset) that
+    line up between holdings and trades. Quantities vary per fund/security
+    copy and prices drift per security and day, within +/-50% and +/-5%.
+    Returns row counts, load timings and the file size.
+    """
+    output_db = Path(output_db)
+    output_db.parent.mkdir(parents=True, exist_ok=True)
+    for path in (output_db, Path(f"{output_db}.wal")):
+        if path.exists():
+            path.unlink()
+
+    conn = duckdb.connect(str(output_db))
+    if memory_limit:
+        conn.execute(f"SET memory_limit = '{memory_limit}'")
+    source = str(source_db).replace("'", "''")
+    conn.execute(f"ATTACH '{source}' AS src (READ_ONLY)")
+
+    security_offset = conn.execute(
+        "SELECT GREATEST((SELECT MAX(SecurityId) FROM src.holdings), (SELECT MAX(SecurityId) FROM src.trades)) + 1"
+    ).fetchone()[0]
+    id_offset = conn.execute("SELECT MAX(id) + 1 FROM src.trades").fetchone()[0]
+
+    timings = {}
+    try:
+        # 1. Snapshot dates, counting back from each table's latest date
+        _create_dates(conn, "holding_dates", "SELECT MAX(AsOfDate) FROM src.holdings", dates)
+        _create_dates(conn, "trade_dates", "SELECT MAX(TradeDate) FROM src.trades", dates)
+        conn.execute(f"CREATE TEMP TABLE fund_copies AS SELECT range AS k FROM range({funds})")
+        conn.execute(f"CREATE TEMP TABLE security_copies AS SELECT range AS j FROM range({securities})")
+
+        # 2. Holdings: one row per source lot, fund copy, security copy and date
+        quantity = f"(0.5 + {NOISE.format('h.PortfolioName, h.SecurityId, f.k, s.j')})"
+        price = f"(0.95 + 0.1 * {NOISE.format('h.SecurityId, s.j, d.day_index')})"
+        started = time.perf_counter()
+        conn.execute(f"""
+            CREATE TABLE holdings AS
+            SELECT h.* REPLACE (
+                d.snapshot_date AS AsOfDate,
+                {_suffixed('h.PortfolioName', 'f.k', ' #')} AS PortfolioName,
+                h.SecurityId + s.j * {security_offset} AS SecurityId,
+                {_suffixed('h.SecName', 's.j', ' ')} AS SecName,
+                h.StartQty * {quantity} AS StartQty,
+                h.Qty * {quantity} AS Qty,
+                h.Price * {price} AS Price,
+                h.MV_Local * {quantity} * {price} AS MV_Local,
+                h.MV_Base * {quantity} * {price} AS MV_Base,
+                h.PL_DTD * {quantity} * {price} AS PL_DTD,
+                h.PL_QTD * {quantity} * {price} AS PL_QTD,
+                h.PL_MTD * {quantity} * {price} AS PL_MTD,
+                h.PL_YTD * {quantity} * {price} AS PL_YTD
+            )
+            FROM src.holdings h, fund_copies f, security_copies s, holding_dates d
+        """)
+        timings["load_holdings"] = time.perf_counter() - started
+
+        # 3. Trades: same fund/security copies, every trade repeated per date
+        quantity = f"(0.5 + {NOISE.format('t.PortfolioName, t.SecurityId, f.k, s.j')})"
+        price = f"(0.95 + 0.1 * {NOISE.format('t.SecurityId, s.j, d.day_index')})"
+        copy_index = f"((f.k * {securities} + s.j) * {dates} + d.day_index)"
+        started = time.perf_counter()
+        conn.execute(f"""
+            CREATE TABLE trades AS
+            SELECT t.* REPLACE (
+                t.id + {copy_index} * {id_offset} AS id,
+                {_suffixed('t.PortfolioName', 'f.k', ' #')} AS PortfolioName,
+                t.SecurityId + s.j * {security_offset} AS SecurityId,
+                {_suffixed('t.Name', 's.j', ' ')} AS Name,
+                {_suffixed('t.Ticker', 's.j', '')} AS Ticker,
+                {_suffixed('t.CUSIP', 's.j', '-')} AS CUSIP,
+                {_suffixed('t.ISIN', 's.j', '-')} AS ISIN,
+                d.snapshot_date AS TradeDate,
+                strftime(CAST(d.snapshot_date AS DATE) + INTERVAL 2 DAY, '%Y-%m-%d') AS SettleDate,
+                CAST(t.Quantity * {quantity} AS BIGINT) AS Quantity,
+                t.Price * {price} AS Price,
+                t.Principal * {quantity} * {price} AS Principal,
+                t.TotalCash * {quantity} * {price} AS TotalCash,
+                t.AllocationQTY * {quantity} AS AllocationQTY,
+                t.AllocationPrincipal * {quantity} * {price} AS AllocationPrincipal,
+                t.AllocationCash * {quantity} * {price} AS AllocationCash
+            )
+            FROM src.trades t, fund_copies f, security_copies s, trade_dates d
+        """)
+        timings["load_trades"] = time.perf_counter() - started
+        conn.execute("DETACH src")
+
+        # 4. The same indexes, views and summaries as the real database
+        started = time.perf_counter()
+        for table in SOURCES:
+            create_indexes(conn, table)
+        timings["create_indexes"] = time.perf_counter() - started
+
+        create_views(conn)
+        apply_comments(conn)
+        started = time.perf_counter()
+        create_materialized_tables(conn)
+        refresh_summaries(conn)
+        timings["refresh_summaries"] = time.perf_counter() - started
+
+        counts = {
+            table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in ("holdings", "trades")
+        }
+        conn.execute("CHECKPOINT")
+    finally:
+        conn.close()
+
+    return {
+        "rows": counts,
+        "timings_seconds": {name: round(seconds, 3) for name, seconds in timings.items()},
+        "file_mb": round(output_db.stat().st_size / 2**20, 1),
+    }
+
+
+def time_queries(db_path=DEFAULT_OUTPUT, repeat=5):
+    """Time every reference view and the sample questions on `db_path`.
+
+    Views are read directly; questions run through QueryExecutor (guard,
+    materialized tables, Arrow fetch) as the API would. Router questions
+    use the router's SQL, the rest the SQL labelled in the corpus.
+    """
+    results = {"views": {}, "questions": []}
+
+    conn = duckdb.connect(str(db_path), read_only=True)
+    try:
+        for view in REFERENCE_VIEWS:
+            results["views"][view] = _time(lambda: conn.execute(f"SELECT * FROM {view}").arrow(), repeat)
+    finally:
+        conn.close()
+
+    # Without the result cache, so repeats time DuckDB rather than a dict lookup
+    executor = QueryExecutor(str(db_path), max_rows=1000, result_cache_bytes=0)
+    router = SQLRouter(executor.fund_names())
+    for item in load_corpus():
+        routed = router.route(item["question"])
+        sql = routed["sql"] if routed else item.get("sql")
+        if not sql:
+            continue
+        outcome = executor.execute(sql)
+        timing = _time(lambda: executor.execute(sql), repeat)
+        timing.update(
+            question=item["question"],
+            source="router" if routed else "corpus",
+            rows=outcome.get("row_count", 0),
+            error=outcome.get("error"),
+        )
+        results["questions"].append(timing)
+    return results
+
+
+def _create_dates(conn, name, latest_sql, count):
+    # The latest date itself plus the weekdays before it
+    conn.execute(f"""
+        CREATE TEMP TABLE {name} AS
+        WITH days AS (
+            SELECT range AS offset_days, CAST(({latest_sql}) AS DATE) - CAST(range AS INTEGER) AS day
+            FROM range({count * 7 // 5 + 7})
+        )
+        SELECT strftime(day, '%Y-%m-%d') AS snapshot_date, day_index
+        FROM (
+            SELECT day, ROW_NUMBER() OVER (ORDER BY day DESC) - 1 AS day_index
+            FROM days
+            WHERE offset_days = 0 OR dayofweek(day) NOT IN (0, 6)
+        )
+        WHERE day_index < {count}
+    """)
+
+
+def _suffixed(column, copy, separator):
+    # Copy 0 keeps the original value so the source rows are a subset
+    return f"CASE WHEN {copy} = 0 OR {column} IS NULL THEN {column} ELSE {column} || '{separator}' || ({copy} + 1) END"
+
+
+def _time(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return {
+        "median_ms": round(1000 * statistics.median(samples), 2),
+        "min_ms": round(1000 * min(samples), 2),
+        "max_ms": round(1000 * max(samples), 2),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a scaled-up copy of the database and time queries on it.")
+    parser.add_argument("--source", default=str(DEFAULT_DB_PATH))
+    parser.add_argument("--db", default=str(DEFAULT_OUTPUT), help="Scaled database to (re)create")
+    parser.add_argument("--funds", type=int, default=10, help="Copies of each fund")
+    parser.add_argument("--securities", type=int, default=4, help="Copies of each security")
+    parser.add_argument("--dates", type=int, help="Daily snapshots (default 20)")
+    parser.add_argument("--holdings-rows", type=int, help="Pick --dates to reach about this many holdings rows")
+    parser.add_argument("--memory-limit", help="DuckDB memory_limit while building, e.g. 4GB")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per timed query")
+    parser.add_argument("--skip-build", action="store_true", help="Only time queries on an existing --db")
+    parser.add_argument("--output", help="Write the JSON report here")
+    args = parser.parse_args()
+
+    report = {"commit": _git_commit(), "config": vars(args)}
+    if not args.skip_build:
+        dates = args.dates or 20
+        if args.holdings_rows:
+            with duckdb.connect(args.source, read_only=True) as conn:
+                base_rows = conn.execute("SELECT COUNT(*) FROM holdings").fetchone()[0]
+            dates = max(1, math.ceil(args.holdings_rows / (base_rows * args.funds * args.securities)))
+        print(f"Building {args.db}: {args.funds} fund copies x {args.securities} security copies x {dates} dates")
+        report["build"] = scale(args.source, args.db, args.funds, args.securities, dates, args.memory_limit)
+        print(json.dumps(report["build"], indent=2))
+
+    report["queries"] = time_queries(args.db, args.repeat)
+    for view, timing in report["queries"]["views"].items():
+        print(f"{view:<22} {timing['median_ms']:>10} ms")
+    for timing in report["queries"]["questions"]:
+        print(f"{timing['median_ms']:>10} ms  {timing['rows']:>5} rows  {timing['question']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
@@ -0,0 +1,125 @@
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+from llm.prompt_compiler import estimate_tokens
+
+# Just the question line: entity hints and conversation context are on other lines
+SQL_REQUEST = re.compile(r"^Generate SQL for: (.*)$", re.MULTILINE)
+DEFAULT_SQL = "SELECT PortfolioName, ytd_pl FROM v_fund_summary ORDER BY ytd_pl DESC LIMIT 5"
+DEFAULT_ANSWER = (
+    "Based on the latest snapshot, the funds above are ranked by the requested "
+    "metric. The leading fund is well ahead of the rest of the list."
+)
+
+
+class StubLLM:
+    """Canned responses standing in for the HuggingFace Inference API.
+
+    SQL requests are answered from `sql_by_question` (unknown questions get
+    `default_sql`, a None entry gets an error); anything else gets `answer`.
+    Every call sleeps for `latency_ms` +/- `jitter_ms`, and streamed answers
+    spread that time over the tokens.
+    """
+
+    def __init__(self, sql_by_question=None, latency_ms=400, jitter_ms=100,
+                 default_sql=DEFAULT_SQL, answer=DEFAULT_ANSWER, seed=0):
+        self.sql_by_question = {question.lower(): sql for question, sql in (sql_by_question or {}).items()}
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.default_sql = default_sql
+        self.answer = answer
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_corpus(cls, corpus, **kwargs):
+        sql_by_question = {item["question"]: item.get("sql") for item in corpus}
+        return cls(sql_by_question, **kwargs)
+
+    def delay(self):
+        with self._lock:
+            self.calls += 1
+            jitter = self._random.uniform(-self.jitter_ms, self.jitter_ms)
+        return max(0.0, self.latency_ms + jitter) / 1000
+
+    def completion_text(self, messages):
+        match = SQL_REQUEST.search(messages[-1]["content"])
+        if match is None:
+            return self.answer
+        sql = self.sql_by_question.get(match.group(1).strip().lower(), self.default_sql)
+        error = None if sql else "Question is not about the available data"
+        return "```json\n" + json.dumps({"sql": sql, "error": error}) + "\n```"
+
+    def response(self, messages, text):
+        usage = SimpleNamespace(
+            prompt_tokens=sum(estimate_tokens(message["content"]) for message in messages),
+            completion_tokens=estimate_tokens(text),
+        )
+        message = SimpleNamespace(role="assistant", content=text)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+    def chunks(self, text):
+        words = text.split(" ")
+        return [word + (" " if index < len(words) - 1 else "") for index, word in enumerate(words)]
+
+
+class StubInferenceClient:
+    """Drop-in for `huggingface_hub.InferenceClient.chat_completion`."""
+
+    def __init__(self, llm):
+        self.llm = llm
+
+    def chat_completion(self, messages, stream=False, **kwargs):
+        text = self.llm.completion_text(messages)
+        time.sleep(self.llm.delay())
+        if stream:
+            return iter(_chunk(piece) for piece in self.llm.chunks(text))
+        return self.llm.response(messages, text)
+
+
+class AsyncStubInferenceClient:
+    """Drop-in for `huggingface_hub.AsyncInferenceClient.chat_completion`."""
+
+    def __init__(self, llm):
+        self.llm = llm
+
+    async def chat_completion(self, messages, stream=False, **kwargs):
+        text = self.llm.completion_text(messages)
+        delay = self.llm.delay()
+        if not stream:
+            await asyncio.sleep(delay)
+            return self.llm.response(messages, text)
+
+        pieces = self.llm.chunks(text)
+        # Time to first token is a third of the latency, the rest is spread out
+        await asyncio.sleep(delay / 3)
+
+        async def stream_chunks():
+            for piece in pieces:
+                await asyncio.sleep(2 * delay / 3 / len(pieces))
+                yield _chunk(piece)
+
+        return stream_chunks()
+
+
+def install(chatbot, llm):
+    """Point the chatbot's LLM transport at the stub.
+
+    The persistent LLM cache is bypassed so every run measures the LLM path
+    and stub outputs never land in the real cache file.
+    """
+    for generator in (chatbot.sql_gen, chatbot.answer_gen):
+        generator.transport.client = StubInferenceClient(llm)
+        generator.transport.async_client = AsyncStubInferenceClient(llm)
+        generator.cache = None
+
+
+def _chunk(text):
+    delta = SimpleNamespace(role="assistant", content=text)
+    return SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
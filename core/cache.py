@@ -0,0 +1,81 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class AnswerCache:
+    """LRU + TTL cache whose keys are tagged with the database data version.
+
+    A change of data version (e.g. after a new ingest) makes every older
+    entry unreachable; those entries then age out through LRU eviction.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=16 * 1024 * 1024, ttl_seconds=3600):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, data_version):
+        full_key = (data_version, key)
+        with self._lock:
+            entry = self._entries.get(full_key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, size, stored_at = entry
+            if time.monotonic() - stored_at > self.ttl_seconds:
+                self._remove(full_key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(full_key)
+            self.hits += 1
+            return value
+
+    def set(self, key, data_version, value):
+        full_key = (data_version, key)
+        size = len(str(value).encode())
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if full_key in self._entries:
+                self._remove(full_key)
+            self._entries[full_key] = (value, size, time.monotonic())
+            self._bytes += size
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _remove(self, full_key):
+        _, size, _ = self._entries.pop(full_key)
+        self._bytes -= size
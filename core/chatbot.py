@@ -1,45 +1,490 @@
 from llm.sql_generator import SQLGenerator
-from database.query_executor import QueryExecutor
+from database.query_executor import SHARED_VIEWS, QueryExecutor
 from llm.answer_generator import AnswerGenerator
+from llm.sql_router import SQLRouter
+from llm.prompt_compiler import PromptCompiler
+from llm.transport import DEFAULT_MODEL, LLMOverloaded, LLMTransport
+from core.cache import AnswerCache
+from core.entity_index import EntityIndex
+from core.persistent_cache import DEFAULT_PATH as LLM_CACHE_PATH, PersistentLLMCache
+from core.metrics import QUESTIONS, REGISTRY, STAGE_SECONDS
+from core.semantic_cache import SemanticSQLCache, normalize_question
+from core.sessions import SessionStore
+from core.single_flight import SingleFlight
+import asyncio
 import hashlib
-from datetime import datetime, timedelta
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
 
 class FinancialChatbot:
-    def __init__(self, api_key, db_path):
-        print("api",api_key)
-        self.sql_gen = SQLGenerator(api_key)
+    def __init__(self, api_key, db_path, cache_size=1024, cache_ttl=3600, llm_cache_path=LLM_CACHE_PATH):
         self.executor = QueryExecutor(db_path)
-        self.answer_gen = AnswerGenerator(api_key)
-        self.cache = {}
+        # Prompts describe the schema as it is in the database
+        with self.executor.cursors.acquire() as cursor:
+            self.compiler = PromptCompiler.from_connection(cursor)
+        # LLM outputs survive restarts and are shared between workers;
+        # llm_cache_path=None turns this off
+        self.llm_cache = PersistentLLMCache(llm_cache_path) if llm_cache_path else None
+        # One set of pooled clients, retries and concurrency limits for both
+        self.llm_transport = LLMTransport(DEFAULT_MODEL, token=api_key or os.getenv("HF_API_TOKEN"))
+        self.sql_gen = SQLGenerator(compiler=self.compiler, cache=self.llm_cache, transport=self.llm_transport)
+        self.answer_gen = AnswerGenerator(compiler=self.compiler, cache=self.llm_cache, transport=self.llm_transport)
+        self.cache = AnswerCache(max_entries=cache_size, ttl_seconds=cache_ttl)
+        self.sql_cache = SemanticSQLCache()
+        self.router = SQLRouter()
+        # Fund and security names, to fix how questions spell them
+        self.entities = EntityIndex()
+        # Concurrent identical questions / queries share one computation
+        self.question_flight = SingleFlight("question")
+        self.sql_flight = SingleFlight("sql")
+        # Multi-turn conversations and their recent result sets
+        self.sessions = SessionStore()
+        REGISTRY.register_collector(self._collect_metrics)
     
-    def answer(self, question):
+    def answer(self, question, session_id=None):
+        if session_id is not None:
+            return self._answer_in_session(question, session_id)
+
         # 1. Check cache
         cache_key = hashlib.md5(question.lower().encode()).hexdigest()
-        if cache_key in self.cache:
-            cached = self.cache[cache_key]
-            print(cached)
-            if (datetime.now() - cached['time']) < timedelta(hours=1):
-                return cached['answer']
-        
-        # 2. Generate SQL
-        sql_result = self.sql_gen.generate_sql(question)
-        print(sql_result)
-        
+        with STAGE_SECONDS.time(stage="cache_lookup"):
+            data_version = self.executor.data_version()
+            cached = self.cache.get(cache_key, data_version)
+        if cached is not None:
+            QUESTIONS.inc(source="answer_cache")
+            return cached
+
+        return self.question_flight.do(
+            _question_key(question, data_version),
+            lambda: self._answer_uncached(question, cache_key, data_version)
+        )
+
+    def _answer_uncached(self, question, cache_key, data_version):
+        # 2. Generate SQL: known templates, then paraphrases of earlier
+        #    questions, and only then the LLM
+        sql_result = self._generate_sql(question, data_version)
+
         if not sql_result.get('sql'):
             return "Sorry, cannot find the answer in the available data."
         
         # 3. Execute query
-        query_result = self.executor.execute(sql_result['sql'])
-        print(query_result)
+        with STAGE_SECONDS.time(stage="query_execution"):
+            query_result = self._execute(sql_result['sql'], data_version)
+        logger.debug("Query result: error=%s rows=%s", query_result.get('error'), query_result.get('row_count'))
         
         # 4. Generate answer
-        answer = self.answer_gen.generate_answer(question, query_result)
+        with STAGE_SECONDS.time(stage="answer_generation"):
+            answer = self.answer_gen.generate_answer(
+                question, query_result, data_version=data_version, sql=sql_result['sql']
+            )
         
         # 5. Cache result
-        self.cache[cache_key] = {
-            'answer': answer,
-            'time': datetime.now()
+        self.cache.set(cache_key, data_version, answer)
+
+        return answer
+
+    def _answer_in_session(self, question, session_id):
+        """answer() for one turn of a conversation.
+
+        Follow-ups can filter or re-rank the session's earlier results
+        locally, and the LLM sees the conversation so far. Answers depend
+        on that context, so the answer cache is not used.
+        """
+        data_version = self.executor.data_version()
+        session = self.sessions.get(session_id, data_version)
+
+        sql_result = self._session_sql(question, session, data_version)
+        sql = sql_result.get('sql')
+        query_result = None
+        if not sql:
+            answer = "Sorry, cannot find the answer in the available data."
+        else:
+            with STAGE_SECONDS.time(stage="query_execution"):
+                query_result = self._execute(sql, data_version, session)
+            with STAGE_SECONDS.time(stage="answer_generation"):
+                answer = self.answer_gen.generate_answer(question, query_result, data_version=data_version, sql=sql)
+
+        session.record(question, sql, query_result)
+        self.sessions.trim()
+        return answer
+
+    def _session_sql(self, question, session, data_version):
+        if not (session.has_results and self.router.is_follow_up(question)):
+            return self._generate_sql(question, data_version)
+        sql_result = self._route_follow_up(question, session)
+        if sql_result is None:
+            sql_result = self._generate_sql(question, data_version, context=session.context())
+        return sql_result
+
+    def _route_follow_up(self, question, session):
+        with STAGE_SECONDS.time(stage="sql_generation"):
+            sql_result = self.router.route_follow_up(question, session.columns(), funds=session.funds())
+        if sql_result is not None:
+            sql_result['source'] = 'session'
+            QUESTIONS.inc(source='session')
+            logger.debug("Follow-up SQL for %r: %s", question, sql_result)
+        return sql_result
+
+    def _generate_sql(self, question, data_version, context=None):
+        """Router, then paraphrase cache, then the LLM. With conversation
+        `context` only the LLM can take it into account."""
+        with STAGE_SECONDS.time(stage="sql_generation"):
+            if self.router.data_version != data_version:
+                self._refresh_router(data_version)
+            sql_question, entities = self.entities.resolve(question)
+            sql_result = self._route(sql_question, entities) if context is None else None
+            if sql_result is None:
+                sql_result = self.sql_gen.generate_sql(sql_question, data_version, entities=entities, context=context)
+                sql_result['source'] = 'llm_cache' if sql_result.get('cached') else 'llm'
+                if sql_result.get('sql') and context is None:
+                    self.sql_cache.add(sql_question, sql_result['sql'], entities)
+        QUESTIONS.inc(source=sql_result['source'])
+        logger.debug("SQL for %r: %s", question, sql_result)
+        return sql_result
+
+    def _execute(self, sql, data_version, session=None):
+        relations = session.relations_for(sql) if session is not None else None
+        if relations:
+            # Reads this session's results: nothing to share with other callers
+            return self.executor.execute(sql, relations)
+        return self.sql_flight.do(_sql_key(sql, data_version), lambda: self.executor.execute(sql))
+
+    def close(self):
+        """Stop reporting metrics and close the database."""
+        REGISTRY.unregister_collector(self._collect_metrics)
+        if self.llm_cache is not None:
+            self.llm_cache.flush_touches()
+        self.executor.close()
+
+    def warm_up(self, sample_questions=("Which fund performed best this year?", "Total cash by trade type")):
+        """Do the first-request work up front and return per-step timings.
+
+        Opens the database and reads the data version, runs each summary
+        view once (warming DuckDB and the SQL guard), loads fund names into
+        the router and compiles prompts and question embeddings.
+        """
+        timings = {}
+
+        # 1. Database and data version
+        started = time.perf_counter()
+        data_version = self.executor.data_version()
+        timings["database"] = time.perf_counter() - started
+
+        # 2. Reference views
+        started = time.perf_counter()
+        for view in sorted(SHARED_VIEWS):
+            result = self.executor.execute(f"SELECT * FROM {view}")
+            if result.get("error") and result["error"] != "No data found":
+                raise RuntimeError(f"{view}: {result['error']}")
+        timings["views"] = time.perf_counter() - started
+
+        # 3. Router and prompts
+        started = time.perf_counter()
+        self._refresh_router(data_version)
+        for question in sample_questions:
+            self.sql_gen._build_messages(question)
+            self.sql_cache.embed(normalize_question(question))
+        self.compiler.answer_system_prompt([])
+        timings["prompts"] = time.perf_counter() - started
+
+        return {step: round(seconds, 4) for step, seconds in timings.items()}
+
+    def _refresh_router(self, data_version):
+        # The entity index and the router's fund names follow the data version
+        self.entities.rebuild(self.executor.entity_values(), data_version)
+        self.router.update_funds(self.entities.funds(), data_version)
+
+    def _route(self, question, entities=None):
+        sql_result = self.router.route(question)
+        if sql_result is not None:
+            sql_result['source'] = 'router'
+            return sql_result
+        sql_result = self.sql_cache.lookup(question, entities)
+        if sql_result is not None:
+            sql_result['source'] = 'sql_cache'
+        return sql_result
+
+    async def answer_async(self, question, session_id=None):
+        # Same pipeline as answer(), but LLM calls and the DuckDB query are
+        # awaited so one worker can serve many questions concurrently
+        if session_id is not None:
+            return await self._answer_in_session_async(question, session_id)
+
+        cache_key = hashlib.md5(question.lower().encode()).hexdigest()
+        with STAGE_SECONDS.time(stage="cache_lookup"):
+            data_version = await self.executor.run_async(self.executor.data_version)
+            cached = self.cache.get(cache_key, data_version)
+        if cached is not None:
+            QUESTIONS.inc(source="answer_cache")
+            return cached
+
+        return await self.question_flight.do_async(
+            _question_key(question, data_version),
+            lambda: self._answer_uncached_async(question, cache_key, data_version)
+        )
+
+    async def _answer_uncached_async(self, question, cache_key, data_version):
+        sql_result = await self._generate_sql_async(question, data_version)
+
+        if not sql_result.get('sql'):
+            return "Sorry, cannot find the answer in the available data."
+
+        with STAGE_SECONDS.time(stage="query_execution"):
+            query_result = await self._execute_async(sql_result['sql'], data_version)
+
+        with STAGE_SECONDS.time(stage="answer_generation"):
+            answer = await self.answer_gen.generate_answer_async(
+                question, query_result, data_version=data_version, sql=sql_result['sql']
+            )
+
+        self.cache.set(cache_key, data_version, answer)
+
+        return answer
+
+    async def _answer_in_session_async(self, question, session_id):
+        data_version = await self.executor.run_async(self.executor.data_version)
+        session = self.sessions.get(session_id, data_version)
+
+        sql_result = await self._session_sql_async(question, session, data_version)
+        sql = sql_result.get('sql')
+        query_result = None
+        if not sql:
+            answer = "Sorry, cannot find the answer in the available data."
+        else:
+            with STAGE_SECONDS.time(stage="query_execution"):
+                query_result = await self._execute_async(sql, data_version, session)
+            with STAGE_SECONDS.time(stage="answer_generation"):
+                answer = await self.answer_gen.generate_answer_async(
+                    question, query_result, data_version=data_version, sql=sql
+                )
+
+        session.record(question, sql, query_result)
+        self.sessions.trim()
+        return answer
+
+    async def _session_sql_async(self, question, session, data_version):
+        if not (session.has_results and self.router.is_follow_up(question)):
+            return await self._generate_sql_async(question, data_version)
+        sql_result = self._route_follow_up(question, session)
+        if sql_result is None:
+            sql_result = await self._generate_sql_async(question, data_version, context=session.context())
+        return sql_result
+
+    async def stream_answer(self, question, session_id=None):
+        """Run the pipeline, yielding (event, payload) pairs as stages finish.
+
+        Events: "sql", "query", then "token" for each answer chunk and a
+        final "done" with the full answer.
+        """
+        cache_key = hashlib.md5(question.lower().encode()).hexdigest()
+        data_version = await self.executor.run_async(self.executor.data_version)
+        session = self.sessions.get(session_id, data_version) if session_id is not None else None
+        cached = self.cache.get(cache_key, data_version) if session is None else None
+        if cached is not None:
+            QUESTIONS.inc(source="answer_cache")
+            yield "token", {"text": cached}
+            yield "done", {"answer": cached, "cached": True}
+            return
+
+        if session is None:
+            sql_result = await self._generate_sql_async(question, data_version)
+        else:
+            sql_result = await self._session_sql_async(question, session, data_version)
+        yield "sql", {"sql": sql_result.get('sql'), "source": sql_result.get('source')}
+
+        if not sql_result.get('sql'):
+            answer = "Sorry, cannot find the answer in the available data."
+            if session is not None:
+                session.record(question, None, None)
+            yield "token", {"text": answer}
+            yield "done", {"answer": answer, "cached": False}
+            return
+
+        with STAGE_SECONDS.time(stage="query_execution"):
+            query_result = await self._execute_async(sql_result['sql'], data_version, session)
+        yield "query", {
+            "error": query_result.get('error'),
+            "rows": query_result.get('row_count', 0),
+            "truncated": query_result.get('truncated', False),
         }
-        print(self.cache)
 
-        return answer
\ No newline at end of file
+        chunks = []
+        answer_usage = {}
+        started = time.perf_counter()
+        async for chunk in self.answer_gen.stream_answer_async(
+                question, query_result, usage=answer_usage, data_version=data_version, sql=sql_result['sql']):
+            chunks.append(chunk)
+            yield "token", {"text": chunk}
+
+        # Includes time the client takes to read tokens, as users see it
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage="answer_generation")
+        answer = "".join(chunks).strip()
+        if session is None:
+            self.cache.set(cache_key, data_version, answer)
+        else:
+            session.record(question, sql_result['sql'], query_result)
+            self.sessions.trim()
+        yield "done", {
+            "answer": answer,
+            "cached": False,
+            "usage": {"sql": sql_result.get('usage'), "answer": answer_usage or None},
+        }
+
+    async def answer_batch(self, questions, concurrency=8):
+        """Answer many questions at once.
+
+        SQL is generated concurrently, identical SQL is executed once, and
+        queries over the same summary view share one DuckDB pass. Returns one
+        dict per question with the answer, where it came from and latency.
+
+        A question that fails does not fail the batch: its `status` is
+        "overloaded" (with `retry_after`) or "error", `error` says why and
+        `answer` is None. Answered questions have status "ok".
+        """
+        started = time.perf_counter()
+        semaphore = asyncio.Semaphore(concurrency)
+        data_version = await self.executor.run_async(self.executor.data_version)
+        items = [
+            {"question": question, "status": "ok", "error": None, "answer": None, "sql": None, "source": None}
+            for question in questions
+        ]
+
+        # 1. Answer cache
+        pending = []
+        for item in items:
+            cache_key = hashlib.md5(item["question"].lower().encode()).hexdigest()
+            cached = self.cache.get(cache_key, data_version)
+            if cached is not None:
+                QUESTIONS.inc(source="answer_cache")
+                item.update(answer=cached, source="answer_cache",
+                            latency_ms=1000 * (time.perf_counter() - started))
+            else:
+                pending.append(item)
+
+        # 2. SQL generation, concurrently
+        async def generate(item):
+            item["usage"] = {"sql": None, "answer": None}
+            async with semaphore:
+                try:
+                    sql_result = await self._generate_sql_async(item["question"], data_version)
+                except Exception as e:
+                    _batch_failure(item, e, started)
+                    return
+            item["usage"]["sql"] = sql_result.get("usage")
+            item.update(sql=sql_result.get("sql"), source=sql_result.get("source"))
+
+        await asyncio.gather(*(generate(item) for item in pending))
+        pending = [item for item in pending if item["status"] == "ok"]
+
+        # 3. One execution pass for all distinct SQL
+        to_run = [item for item in pending if item["sql"]]
+        with STAGE_SECONDS.time(stage="query_execution"):
+            query_results = await self.executor.execute_many_async([item["sql"] for item in to_run])
+
+        # 4. Answers, with bounded concurrency
+        async def respond(item, query_result):
+            async with semaphore:
+                if query_result is None:
+                    answer = "Sorry, cannot find the answer in the available data."
+                else:
+                    answer_usage = {}
+                    try:
+                        with STAGE_SECONDS.time(stage="answer_generation"):
+                            answer = await self.answer_gen.generate_answer_async(
+                                item["question"], query_result, usage=answer_usage, data_version=data_version,
+                                sql=item["sql"]
+                            )
+                    except Exception as e:
+                        _batch_failure(item, e, started)
+                        return
+                    item["usage"]["answer"] = answer_usage or None
+                    cache_key = hashlib.md5(item["question"].lower().encode()).hexdigest()
+                    self.cache.set(cache_key, data_version, answer)
+            item.update(answer=answer, latency_ms=1000 * (time.perf_counter() - started))
+
+        results_by_item = {id(item): result for item, result in zip(to_run, query_results)}
+        await asyncio.gather(*(respond(item, results_by_item.get(id(item))) for item in pending))
+
+        return items
+
+    async def _generate_sql_async(self, question, data_version, context=None):
+        with STAGE_SECONDS.time(stage="sql_generation"):
+            if self.router.data_version != data_version:
+                await self.executor.run_async(self._refresh_router, data_version)
+            sql_question, entities = await self.executor.run_async(self.entities.resolve, question)
+            sql_result = self._route(sql_question, entities) if context is None else None
+            if sql_result is None:
+                sql_result = await self.sql_gen.generate_sql_async(
+                    sql_question, data_version, entities=entities, context=context
+                )
+                sql_result['source'] = 'llm_cache' if sql_result.get('cached') else 'llm'
+                if sql_result.get('sql') and context is None:
+                    self.sql_cache.add(sql_question, sql_result['sql'], entities)
+        QUESTIONS.inc(source=sql_result['source'])
+        logger.debug("SQL for %r: %s", question, sql_result)
+        return sql_result
+
+    async def _execute_async(self, sql, data_version, session=None):
+        relations = session.relations_for(sql) if session is not None else None
+        if relations:
+            return await self.executor.execute_async(sql, relations)
+        return await self.sql_flight.do_async(
+            _sql_key(sql, data_version), lambda: self.executor.execute_async(sql)
+        )
+
+    def _collect_metrics(self):
+        """Gauges for /metrics, read from the caches, router, pool and LLM usage."""
+        metrics = []
+        caches = [("answer", self.cache.stats()), ("sql", self.sql_cache.stats())]
+        if self.llm_cache is not None:
+            caches.append(("llm", self.llm_cache.stats()))
+        if self.executor.results is not None:
+            caches.append(("result", self.executor.results.stats()))
+        for cache_name, stats in caches:
+            for key, value in stats.items():
+                if isinstance(value, (int, float)):
+                    metrics.append((f"chatbot_cache_{key}", f"Cache {key}", {"cache": cache_name}, value))
+        router_stats = self.router.stats()
+        for key in ("lookups", "matches", "match_rate"):
+            metrics.append((f"chatbot_router_{key}", f"Router {key}", None, router_stats[key]))
+        for key, value in self.sessions.stats().items():
+            metrics.append((f"chatbot_sessions_{key}", f"Sessions {key}", None, value))
+        for key, value in self.entities.stats().items():
+            metrics.append((f"chatbot_entities_{key}", f"Entity index {key}", None, value))
+        for key, value in self.llm_transport.stats().items():
+            metrics.append((f"llm_transport_{key}", f"LLM transport {key}", None, value))
+        for key, value in self.executor.pool_stats().items():
+            if isinstance(value, (int, float)):
+                metrics.append((f"duckdb_pool_{key}", f"DuckDB cursor pool {key}", None, value))
+        for kind, generator in (("sql", self.sql_gen), ("answer", self.answer_gen)):
+            for key, value in generator.usage.stats().items():
+                if isinstance(value, (int, float)):
+                    metrics.append((f"llm_usage_{key}", f"LLM usage {key}", {"kind": kind}, value))
+        metrics.append(("chatbot_local_answers", "Answers rendered without the LLM", None,
+                        self.answer_gen.local_answers))
+        for flight in (self.question_flight, self.sql_flight):
+            metrics.append(("chatbot_in_flight", "Distinct calls currently running",
+                            {"kind": flight.name}, flight.stats()["in_flight"]))
+        return metrics
+
+
+def _question_key(question, data_version):
+    # Paraphrases that normalize the same share one answer
+    return normalize_question(question) or question.lower().strip(), data_version
+
+
+def _sql_key(sql, data_version):
+    return " ".join(sql.split()).rstrip(";"), data_version
+
+
+def _batch_failure(item, error, started):
+    # Either phase of answer_batch: record the failure on this question only
+    if isinstance(error, LLMOverloaded):
+        item.update(status="overloaded", retry_after=error.retry_after)
+    else:
+        logger.exception("Failed to answer batch question %r", item["question"])
+        item["status"] = "error"
+    item.update(error=str(error), answer=None, latency_ms=1000 * (time.perf_counter() - started))
@@ -0,0 +1,218 @@
+import re
+import threading
+
+from core.semantic_cache import STOPWORDS
+
+# Order in which entities sharing a spelling are reported
+KINDS = ("fund", "security", "ticker", "cusip", "security_id")
+
+# Words that are never an entity mention on their own or at the edge of a
+# misspelt one ("fund" in "Platpot Fund" still matches exactly)
+COMMON_WORDS = STOPWORDS | {
+    "s", "fund", "funds", "portfolio", "portfolios", "security", "securities", "trade",
+    "trades", "holding", "holdings", "position", "positions", "best", "worst", "top",
+    "most", "least", "total", "all", "each", "per", "how", "many", "much", "this", "that",
+    "year", "month", "quarter", "ytd", "mtd", "qtd", "pl", "p&l", "profit", "loss",
+    "performance", "performing", "performed", "market", "value", "cash", "type", "types",
+    "price", "quantity", "qty", "bought", "sold", "buy", "sell", "held", "hold", "from",
+    "at", "as", "or", "not", "any", "there", "our", "my", "latest", "current", "date",
+}
+
+TOKEN_PATTERN = re.compile(r"\w[\w.&/%-]*\w|\w")
+
+
+class EntityIndex:
+    """Finds fund and security names mentioned in a question.
+
+    Built from the distinct fund names, security names and identifiers in
+    the database. Word windows of the question are matched by compact
+    spelling ("HoldCo1" is "HoldCo 1"), by unique prefix ("Redfield" is
+    "Redfield Accu-Fund") and, for typos, by character-trigram overlap or
+    edit distance. Only capitalized words or words with digits are matched
+    loosely, so "weather" is not taken for "Heather".
+    Tickers only match exactly and in upper case. `rebuild()` swaps in a
+    complete new index, so lookups never see a half-built one.
+
+    Trigrams shared by more than `max_postings` names are not indexed, so
+    one lookup looks at a bounded number of candidates; those are still
+    scored on all their trigrams.
+    """
+
+    def __init__(self, threshold=0.75, max_window=8, max_postings=200):
+        self.threshold = threshold
+        self.max_window = max_window
+        self.max_postings = max_postings
+        self.data_version = None
+        self._index = _build([], max_postings)
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.resolved = 0
+        self.corrected = 0
+
+    def rebuild(self, rows, data_version=None):
+        """`rows` are (kind, column, value), as from QueryExecutor.entity_values()."""
+        self._index = _build(rows, self.max_postings)
+        self.data_version = data_version
+
+    def funds(self):
+        return [entity["value"] for entity in self._index["entities"] if entity["kind"] == "fund"]
+
+    def resolve(self, question):
+        """Return (question with names spelled as stored, matches).
+
+        Each match is a dict with the `mention` as written, the stored
+        `value`, its `kind`, the `columns` holding it and a `score`
+        (1.0 for an exact spelling).
+        """
+        index = self._index
+        spans = [match.span() for match in TOKEN_PATTERN.finditer(question)]
+
+        # 1. Best entity for every window of up to `max_window` words
+        candidates = []
+        for first in range(len(spans)):
+            for last in range(first, min(first + self.max_window, len(spans))):
+                start, end = spans[first][0], spans[last][1]
+                words = [question[s:e].lower() for s, e in spans[first:last + 1]]
+                if all(word in COMMON_WORDS for word in words):
+                    continue
+                mention = question[start:end]
+                loose = mention[0].isupper() or any(char.isdigit() for char in mention)
+                similar = loose and words[0] not in COMMON_WORDS and words[-1] not in COMMON_WORDS
+                score, positions = self._match(index, mention, loose, similar)
+                if positions:
+                    candidates.append((score, end - start, start, end, positions))
+
+        # 2. Highest-scoring, then longest, windows that do not overlap
+        matches, taken = [], []
+        for score, _, start, end, positions in sorted(candidates, reverse=True):
+            if any(start < other_end and other_start < end for other_start, other_end in taken):
+                continue
+            taken.append((start, end))
+            for position in positions:
+                entity = index["entities"][position]
+                matches.append({
+                    "mention": question[start:end],
+                    "value": entity["value"],
+                    "kind": entity["kind"],
+                    "columns": entity["columns"],
+                    "score": score,
+                    "span": (start, end),
+                })
+        matches.sort(key=lambda match: (match["span"], KINDS.index(match["kind"])))
+
+        # 3. Respell names in the question, right to left so spans stay valid
+        resolved = question
+        respelled = set()
+        for match in sorted(matches, key=lambda match: match["span"], reverse=True):
+            start, end = match["span"]
+            if match["kind"] in ("fund", "security") and (start, end) not in respelled:
+                respelled.add((start, end))
+                resolved = resolved[:start] + match["value"] + resolved[end:]
+
+        with self._lock:
+            self.lookups += 1
+            self.resolved += bool(matches)
+            self.corrected += resolved != question
+        return resolved, matches
+
+    def _match(self, index, mention, loose, similar):
+        """(score, entity positions) for one window of the question.
+
+        Prefixes are only tried when `loose` is set, and similar spellings
+        only when `similar` is, i.e. the window also does not start or end
+        with a common word.
+        """
+        # 1. Exact: ticker as written, anything else by compact spelling
+        positions = list(index["tickers"].get(mention, ()))
+        key = _compact(mention)
+        positions += index["exact"].get(key, [])
+        if positions:
+            return 1.0, sorted(set(positions), key=lambda p: KINDS.index(index["entities"][p]["kind"]))
+        if not loose or len(key) < 4 or len(key) > index["max_length"] + 2:
+            return 0.0, []
+
+        grams = _trigrams(key)
+        entities = index["entities"]
+        candidates = {position for gram in grams for position in index["trigrams"].get(gram, ())}
+        shared = {position: len(grams & entities[position]["trigrams"]) for position in candidates}
+
+        # 2. A prefix of exactly one name
+        prefixed = [position for position in shared if entities[position]["key"].startswith(key)]
+        if prefixed:
+            return (0.9, prefixed) if _one_spelling(entities, prefixed) else (0.0, [])
+
+        # 3. Closest spelling by trigram overlap (Dice coefficient) or, as
+        #    trigrams punish short names, edit distance
+        if not similar:
+            return 0.0, []
+        best, best_positions = 0.0, []
+        for position, count in shared.items():
+            other = entities[position]["key"]
+            score = 2 * count / (len(grams) + len(entities[position]["trigrams"]))
+            if len(key) >= 5 and abs(len(key) - len(other)) <= 2:
+                score = max(score, 1 - _edit_distance(key, other) / max(len(key), len(other)))
+            if score > best:
+                best, best_positions = score, [position]
+            elif score == best:
+                best_positions.append(position)
+        if best >= self.threshold and _one_spelling(entities, best_positions):
+            return round(best, 3), best_positions
+        return 0.0, []
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entities": len(self._index["entities"]),
+                "lookups": self.lookups,
+                "resolved": self.resolved,
+                "corrected": self.corrected,
+            }
+
+
+def _build(rows, max_postings):
+    entities = {}
+    for kind, column, value in rows:
+        entity = entities.setdefault((kind, value), {"kind": kind, "value": value, "columns": []})
+        if column not in entity["columns"]:
+            entity["columns"].append(column)
+    entities = list(entities.values())
+
+    exact, tickers, trigrams = {}, {}, {}
+    max_length = 0
+    for position, entity in enumerate(entities):
+        if entity["kind"] == "ticker":
+            tickers.setdefault(entity["value"].upper(), []).append(position)
+            continue
+        entity["key"] = key = _compact(entity["value"])
+        entity["trigrams"] = _trigrams(key)
+        exact.setdefault(key, []).append(position)
+        if entity["kind"] in ("fund", "security"):
+            max_length = max(max_length, len(key))
+            for gram in entity["trigrams"]:
+                trigrams.setdefault(gram, []).append(position)
+    trigrams = {gram: positions for gram, positions in trigrams.items() if len(positions) <= max_postings}
+    return {"entities": entities, "exact": exact, "tickers": tickers, "trigrams": trigrams,
+            "max_length": max_length}
+
+
+def _compact(text):
+    return re.sub(r"[^a-z0-9]", "", text.lower())
+
+
+def _trigrams(key):
+    padded = f"${key}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _edit_distance(a, b):
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+def _one_spelling(entities, positions):
+    return len({entities[position]["key"] for position in positions}) == 1
@@ -0,0 +1,217 @@
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from database.ingest import PROJECT_ROOT
+
+DEFAULT_PATH = Path(os.getenv("LLM_CACHE_PATH", PROJECT_ROOT / "data" / "cache" / "llm_cache.sqlite3"))
+
+
+class PersistentLLMCache:
+    """LLM outputs in a local SQLite file, shared by every worker process.
+
+    Entries are keyed on model name, a hash of the exact prompt messages and
+    the data version, so a changed prompt or reloaded data never returns a
+    stale output. SQLite in WAL mode lets several uvicorn workers read and
+    write concurrently. When the stored values pass `max_bytes` the least
+    recently used entries are deleted; `compact()` also drops entries older
+    than `max_age_seconds` and returns the space to the filesystem.
+
+    Hits do not write: their `last_used` times are collected and written
+    in one batch every `touch_flush_seconds`. A locked database is waited
+    on for at most `busy_timeout` seconds, then counted as a miss. The
+    async methods run the SQLite calls on a worker thread. Entry and byte
+    counts are kept in process and re-read at each eviction check.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, max_bytes=256 * 1024 * 1024, max_age_seconds=30 * 24 * 3600,
+                 evict_check_every=100, touch_flush_seconds=30, busy_timeout=0.25):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.evict_check_every = evict_check_every
+        self.touch_flush_seconds = touch_flush_seconds
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._touched = {}
+        self._flushed_at = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.entries = 0
+        self.bytes = 0
+        self.file_bytes = 0
+
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                model TEXT NOT NULL,
+                data_version TEXT,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache(last_used)")
+        self._refresh_totals(conn)
+
+    def _conn(self):
+        # sqlite3 connections are per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def make_key(kind, model, messages, data_version):
+        prompt_hash = hashlib.sha256(json.dumps(messages, sort_keys=True).encode()).hexdigest()
+        return hashlib.sha256(f"{kind}\0{model}\0{prompt_hash}\0{data_version}".encode()).hexdigest()
+
+    def get(self, kind, model, messages, data_version=None):
+        """Return the stored value (JSON-decoded) or None."""
+        key = self.make_key(kind, model, messages, data_version)
+        try:
+            row = self._conn().execute("SELECT value FROM llm_cache WHERE key = ?", [key]).fetchone()
+        except sqlite3.Error:
+            # The cache is an optimization; a locked or broken file is a miss
+            with self._lock:
+                self.errors += 1
+            return None
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._touched[key] = time.time()
+            flush = time.monotonic() - self._flushed_at > self.touch_flush_seconds
+        if flush:
+            self.flush_touches()
+        return json.loads(row[0])
+
+    def flush_touches(self):
+        """Write the `last_used` times of recent hits in one statement."""
+        with self._lock:
+            touched, self._touched = self._touched, {}
+            self._flushed_at = time.monotonic()
+        if not touched:
+            return
+        try:
+            self._conn().executemany(
+                "UPDATE llm_cache SET last_used = MAX(last_used, ?) WHERE key = ?",
+                [(used, key) for key, used in touched.items()]
+            )
+        except sqlite3.Error:
+            with self._lock:
+                self.errors += 1
+
+    def set(self, kind, model, messages, data_version, value):
+        key = self.make_key(kind, model, messages, data_version)
+        encoded = json.dumps(value)
+        now = time.time()
+        try:
+            self._conn().execute(
+                "INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [key, kind, model, data_version, encoded, len(encoded), now, now]
+            )
+        except sqlite3.Error:
+            with self._lock:
+                self.errors += 1
+            return
+        with self._lock:
+            self._writes += 1
+            # Until the next check; a replaced key is counted again
+            self.entries += 1
+            self.bytes += len(encoded)
+            check = self._writes % self.evict_check_every == 0
+        if check:
+            try:
+                self.evict()
+            except sqlite3.Error:
+                with self._lock:
+                    self.errors += 1
+
+    def evict(self):
+        """Delete least recently used entries until under 90% of `max_bytes`."""
+        self.flush_touches()
+        conn = self._conn()
+        total = self._refresh_totals(conn)
+        if total <= self.max_bytes:
+            return 0
+        target = int(self.max_bytes * 0.9)
+        cursor = conn.execute("""
+            DELETE FROM llm_cache WHERE key IN (
+                SELECT key FROM (
+                    SELECT key, SUM(size) OVER (ORDER BY last_used DESC) AS kept
+                    FROM llm_cache
+                ) WHERE kept > ?
+            )
+        """, [target])
+        self._refresh_totals(conn)
+        return cursor.rowcount
+
+    def _refresh_totals(self, conn):
+        entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+        file_bytes = self.path.stat().st_size if self.path.exists() else 0
+        with self._lock:
+            self.entries, self.bytes, self.file_bytes = entries, size, file_bytes
+        return size
+
+    def compact(self):
+        """Drop expired entries, evict to size and shrink the file."""
+        conn = self._conn()
+        expired = conn.execute(
+            "DELETE FROM llm_cache WHERE last_used < ?", [time.time() - self.max_age_seconds]
+        ).rowcount
+        evicted = self.evict()
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.execute("VACUUM")
+        self._refresh_totals(conn)
+        return {"expired": expired, "evicted": evicted, **self.stats()}
+
+    def clear(self):
+        conn = self._conn()
+        conn.execute("DELETE FROM llm_cache")
+        with self._lock:
+            self._touched = {}
+        self._refresh_totals(conn)
+
+    def stats(self):
+        """Counters kept in process: no query, safe to call on the event loop."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": self.entries,
+                "bytes": self.bytes,
+                "file_bytes": self.file_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "errors": self.errors,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or compact the persistent LLM cache")
+    parser.add_argument("--path", default=str(DEFAULT_PATH))
+    parser.add_argument("--compact", action="store_true", help="Drop expired entries, evict to size, VACUUM")
+    parser.add_argument("--clear", action="store_true", help="Delete every entry")
+    args = parser.parse_args()
+
+    cache = PersistentLLMCache(args.path)
+    if args.clear:
+        cache.clear()
+    print(cache.compact() if args.compact else cache.stats())
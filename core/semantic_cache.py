@@ -0,0 +1,148 @@
+import hashlib
+import re
+import threading
+
+import numpy as np
+
+# Phrases are rewritten before single words so "year to date" wins over "year"
+SYNONYMS = [
+    (r"\bprofit and loss\b|\bprofit & loss\b|\bp&l\b|\bp & l\b|\bpnl\b|\bp/l\b", "pl"),
+    (r"\byear to date\b|\byear-to-date\b|\byearly\b|\bannual(ly)?\b|\bthis year\b", "ytd"),
+    (r"\bmonth to date\b|\bmonth-to-date\b|\bmonthly\b|\bthis month\b", "mtd"),
+    (r"\bquarter to date\b|\bquarter-to-date\b|\bquarterly\b|\bthis quarter\b", "qtd"),
+    (r"\bhighest\b|\btop\b|\bbest performing\b|\bbest-performing\b|\bmaximum\b|\bmax\b|\blargest\b", "best"),
+    (r"\blowest\b|\bworst performing\b|\bworst-performing\b|\bminimum\b|\bmin\b|\bsmallest\b", "worst"),
+    (r"\bfunds\b|\bportfolios?\b", "fund"),
+    (r"\bsecurities\b|\binstruments?\b", "security"),
+    (r"\baum\b|\bmarket value\b|\bassets under management\b", "mv"),
+    (r"\bprofit\b|\bperformance\b|\bperformed\b", "pl"),
+]
+
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "which", "what", "who", "whose",
+    "had", "has", "have", "did", "does", "do", "by", "of", "for", "in", "on", "to",
+    "with", "me", "show", "tell", "give", "list", "please", "its", "their", "and",
+}
+
+# Tokens that flip the meaning of a question; they must match exactly
+GUARD_WORDS = {
+    "best", "worst", "ytd", "mtd", "qtd", "not", "negative", "positive", "trade",
+    "trades", "security", "fund", "mv", "pl", "count", "average", "total",
+}
+
+
+def normalize_question(question):
+    text = question.lower()
+    for pattern, replacement in SYNONYMS:
+        text = re.sub(pattern, replacement, text)
+    text = re.sub(r"[^a-z0-9\s]", " ", text)
+    tokens = [token for token in text.split() if token not in STOPWORDS]
+    return " ".join(tokens)
+
+
+class SemanticSQLCache:
+    """Maps paraphrased questions to previously generated SQL.
+
+    Questions are normalized and embedded as hashed word + character n-gram
+    vectors; lookups are a single matrix-vector product over the index.
+    """
+
+    def __init__(self, threshold=0.9, dim=2048, max_entries=5000):
+        self.threshold = threshold
+        self.dim = dim
+        self.max_entries = max_entries
+        self._vectors = np.zeros((max_entries, dim), dtype=np.float32)
+        self._entries = [None] * max_entries
+        self._size = 0
+        self._next = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def embed(self, normalized):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        features = normalized.split()
+        padded = f" {normalized} "
+        features += [padded[i:i + 3] for i in range(len(padded) - 2)]
+        for feature in features:
+            digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dim
+            sign = 1.0 if digest[4] & 1 else -1.0
+            vector[bucket] += sign
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, question, entities=None):
+        """Cached SQL for a paraphrase of `question`, or None.
+
+        A paraphrase must name the same funds and securities: the
+        EntityIndex matches in `entities` if both questions have them, else
+        every string literal in the cached SQL must appear in the question.
+        """
+        normalized = normalize_question(question)
+        names = _entity_names(entities)
+        query = self.embed(normalized)
+        with self._lock:
+            if self._size:
+                scores = self._vectors[:self._size] @ query
+                for index in np.argsort(scores)[::-1][:5]:
+                    if scores[index] < self.threshold:
+                        break
+                    entry = self._entries[index]
+                    if (_guard_tokens(entry["normalized"]) == _guard_tokens(normalized)
+                            and _same_names(entry, question, names)):
+                        self.hits += 1
+                        return {"sql": entry["sql"], "error": None, "similarity": float(scores[index])}
+            self.misses += 1
+            return None
+
+    def add(self, question, sql, entities=None):
+        normalized = normalize_question(question)
+        vector = self.embed(normalized)
+        entry = {"normalized": normalized, "sql": sql, "names": _entity_names(entities)}
+        with self._lock:
+            slot = self._next
+            self._vectors[slot] = vector
+            self._entries[slot] = entry
+            self._next = (slot + 1) % self.max_entries
+            self._size = min(self._size + 1, self.max_entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries = [None] * self.max_entries
+            self._size = 0
+            self._next = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": self._size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def _guard_tokens(normalized):
+    return {
+        token for token in normalized.split()
+        if token in GUARD_WORDS or any(char.isdigit() for char in token)
+    }
+
+
+def _entity_names(entities):
+    if entities is None:
+        return None
+    return frozenset(match["value"].lower() for match in entities)
+
+
+def _same_names(entry, question, names):
+    if entry["names"] is not None and names is not None:
+        return entry["names"] == names
+    # No entity matches to compare: the SQL's literals must be in the question
+    compact = _compact(question)
+    return all(_compact(literal) in compact for literal in re.findall(r"'((?:[^']|'')*)'", entry["sql"]))
+
+
+def _compact(text):
+    return re.sub(r"[^a-z0-9]", "", text.lower())
@@ -0,0 +1,180 @@
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+
+import pyarrow as pa
+
+
+def result_names(count):
+    """Table names for a session's results, newest first."""
+    return ["last_result"] + [f"result_{i}" for i in range(2, count + 1)]
+
+
+class Session:
+    """One conversation: its recent questions and the result sets they
+    produced, kept as Arrow tables that follow-up SQL can read as
+    `last_result`, `result_2`, ...
+
+    Results belong to one data version; a reload clears them.
+    """
+
+    def __init__(self, session_id, max_results=3, max_bytes=4 * 1024 * 1024, max_turns=4):
+        self.id = session_id
+        self.max_bytes = max_bytes
+        self.names = result_names(max_results)
+        self.results = deque()
+        self.turns = deque(maxlen=max_turns)
+        self.bytes = 0
+        self.data_version = None
+        self.last_used = time.monotonic()
+        self._lock = threading.Lock()
+
+    def sync(self, data_version):
+        with self._lock:
+            self.last_used = time.monotonic()
+            if data_version is not None and data_version != self.data_version:
+                self.results.clear()
+                self.turns.clear()
+                self.bytes = 0
+                self.data_version = data_version
+
+    def record(self, question, sql, query_result):
+        """Remember a turn; a result with rows becomes `last_result`."""
+        data = query_result.get("data") if query_result else None
+        with self._lock:
+            self.turns.append({
+                "question": question,
+                "sql": sql,
+                "rows": (query_result or {}).get("row_count", 0),
+            })
+            if data is None:
+                # Keep the earlier results to refer back to
+                return
+            table = pa.Table.from_pandas(data, preserve_index=False)
+            if table.nbytes > self.max_bytes:
+                # Too big to keep; older results would now be misread as the last one
+                self.results.clear()
+                self.bytes = 0
+                return
+            self.results.appendleft(table)
+            self.bytes += table.nbytes
+            while len(self.results) > len(self.names) or self.bytes > self.max_bytes:
+                self.bytes -= self.results.pop().nbytes
+
+    @property
+    def has_results(self):
+        return bool(self.results)
+
+    def columns(self):
+        with self._lock:
+            return self.results[0].column_names if self.results else []
+
+    def funds(self):
+        """Fund names in the last result, if it has a PortfolioName column."""
+        with self._lock:
+            if not self.results:
+                return set()
+            table = self.results[0]
+            column = next((name for name in table.column_names if name.lower() == "portfolioname"), None)
+            if column is None:
+                return set()
+            return {value for value in table.column(column).unique().to_pylist() if value is not None}
+
+    def relations_for(self, sql):
+        """{name: table} for the session results `sql` refers to."""
+        with self._lock:
+            return {
+                name: table for name, table in zip(self.names, self.results)
+                if re.search(rf"\b{name}\b", sql, flags=re.IGNORECASE)
+            }
+
+    def context(self, max_sql_chars=300):
+        """Earlier questions and result schemas, compact enough for a prompt."""
+        with self._lock:
+            lines = ["EARLIER IN THIS CONVERSATION (oldest first)"]
+            for turn in self.turns:
+                sql = turn["sql"] or "no SQL"
+                if len(sql) > max_sql_chars:
+                    sql = sql[:max_sql_chars] + "..."
+                lines.append(f'- "{turn["question"]}" -> {sql} ({turn["rows"]} rows)')
+            if self.results:
+                lines.append("EARLIER RESULTS, which can be queried as tables (joined to views if needed)")
+                for name, table in zip(self.names, self.results):
+                    columns = ", ".join(f"{field.name} {field.type}" for field in table.schema)
+                    lines.append(f"- {name}({columns}): {table.num_rows} rows")
+            return "\n".join(lines)
+
+
+class SessionStore:
+    """Sessions by id, most recently used last.
+
+    Sessions idle longer than `idle_seconds` are dropped, as are the least
+    recently used ones while there are more than `max_sessions` or all
+    sessions' results together pass `max_bytes`.
+    """
+
+    def __init__(self, max_sessions=1000, idle_seconds=1800, max_bytes=256 * 1024 * 1024,
+                 session_max_bytes=4 * 1024 * 1024, max_results=3, max_turns=4):
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self.max_bytes = max_bytes
+        self.session_max_bytes = session_max_bytes
+        self.max_results = max_results
+        self.max_turns = max_turns
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def get(self, session_id, data_version=None):
+        """The session with this id, created if it is new or has expired."""
+        with self._lock:
+            self._expire()
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = Session(
+                    session_id, self.max_results, self.session_max_bytes, self.max_turns
+                )
+                self.created += 1
+                self._evict()
+            self._sessions.move_to_end(session_id)
+        session.sync(data_version)
+        return session
+
+    def drop(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def trim(self):
+        """Evict least recently used sessions down to the limits."""
+        with self._lock:
+            self._evict()
+
+    def _evict(self):
+        total = sum(session.bytes for session in self._sessions.values())
+        # The newest session is kept even when it alone is over the budget
+        while len(self._sessions) > 1 and (len(self._sessions) > self.max_sessions or total > self.max_bytes):
+            _, session = self._sessions.popitem(last=False)
+            total -= session.bytes
+            self.evicted += 1
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.idle_seconds
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if session.last_used >= cutoff:
+                break
+            del self._sessions[session_id]
+            self.expired += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "bytes": sum(session.bytes for session in self._sessions.values()),
+                "created": self.created,
+                "expired": self.expired,
+                "evicted": self.evicted,
+            }
@@ -0,0 +1,78 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+
+from core.metrics import COALESCED
+
+
+class SingleFlight:
+    """Runs one computation per key at a time; concurrent callers with the
+    same key wait for that computation and share its result (or exception).
+
+    `do()` is for threads and `do_async()` for coroutines on one event loop;
+    they keep separate in-flight tables. Nothing is kept once a call
+    finishes, so this is not a cache.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._tasks = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def do(self, key, func):
+        with self._lock:
+            self.calls += 1
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            COALESCED.inc(kind=self.name)
+            return future.result()
+
+        try:
+            result = func()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    async def do_async(self, key, func):
+        """`func()` returns a coroutine; it runs as a task shared by every
+        caller, so one caller being cancelled does not cancel the others."""
+        with self._lock:
+            self.calls += 1
+            task = self._tasks.get(key)
+            if task is None:
+                task = self._tasks[key] = asyncio.ensure_future(func())
+                task.add_done_callback(lambda done: self._forget(key, done))
+            else:
+                self.coalesced += 1
+                COALESCED.inc(kind=self.name)
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        with self._lock:
+            if self._tasks.get(key) is task:
+                del self._tasks[key]
+        # Mark the exception as seen if every caller has gone away
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._calls) + len(self._tasks),
+            }
@@ -0,0 +1,71 @@
+import pandas as pd
+import pytest
+
+from benchmarks.stub_llm import StubLLM, install
+from core.chatbot import FinancialChatbot
+from core.sessions import Session, SessionStore
+
+FUNDS = pd.DataFrame({"PortfolioName": ["Ytum", "Garfield"], "ytd_pl": [-5.0, 12.0]})
+
+
+def test_record_keeps_newest_result_first():
+    session = Session("s", max_results=2)
+    for value in (1, 2, 3):
+        session.record(f"q{value}", f"SELECT {value}", {"data": pd.DataFrame({"n": [value]}), "row_count": 1})
+
+    assert [table.column("n")[0].as_py() for table in session.results] == [3, 2]
+    assert session.columns() == ["n"]
+    assert set(session.relations_for("SELECT * FROM last_result JOIN result_2 USING (n)")) == {
+        "last_result", "result_2"
+    }
+
+
+def test_result_without_rows_keeps_earlier_results():
+    session = Session("s")
+    session.record("funds", "SELECT ...", {"data": FUNDS, "row_count": 2})
+    session.record("nothing", "SELECT ...", {"error": "No data found", "data": None})
+
+    assert session.funds() == {"Ytum", "Garfield"}
+    assert len(session.turns) == 2
+
+
+def test_new_data_version_clears_session():
+    store = SessionStore()
+    session = store.get("s", "v1")
+    session.record("funds", "SELECT ...", {"data": FUNDS, "row_count": 2})
+
+    assert store.get("s", "v1").has_results
+    assert not store.get("s", "v2").has_results
+
+
+def test_store_evicts_least_recently_used():
+    store = SessionStore(max_sessions=2)
+    store.get("a")
+    store.get("b")
+    store.get("a")
+    store.get("c")
+
+    assert store.drop("a")
+    assert not store.drop("b")
+    assert store.stats()["evicted"] == 1
+
+
+@pytest.fixture
+def chatbot():
+    bot = FinancialChatbot("test-key", "data/processed/financial_data.db", llm_cache_path=None)
+    install(bot, StubLLM(latency_ms=0, jitter_ms=0))
+    yield bot
+    bot.close()
+
+
+def test_follow_up_filters_the_previous_result(chatbot):
+    chatbot.answer("Best 10 funds this year", session_id="s")
+    session = chatbot.sessions.get("s")
+    funds = session.funds()
+
+    chatbot.answer("now only the ones with negative YTD", session_id="s")
+
+    assert session.turns[-1]["sql"].startswith("SELECT * FROM last_result WHERE")
+    assert len(session.results) == 2
+    assert 0 < len(session.funds()) < len(funds)
+    assert (session.results[0].column("ytd_pl").to_pandas() < 0).all()
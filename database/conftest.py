@@ -0,0 +1,42 @@
+import duckdb
+import pytest
+
+from database.create_reference_tables import PROCESSED_DIR, create_views
+from database.ingest import ingest_file
+from database.materialize import create_materialized_tables, refresh_summaries
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """A database built from the cleaned CSVs, with views and refreshed summaries."""
+    path = tmp_path / "financial_data.db"
+    conn = duckdb.connect(str(path))
+    try:
+        ingest_file(conn, "holdings", PROCESSED_DIR / "holdings_clean.csv")
+        ingest_file(conn, "trades", PROCESSED_DIR / "trades_clean.csv")
+        create_views(conn)
+        create_materialized_tables(conn)
+        refresh_summaries(conn)
+    finally:
+        conn.close()
+    return path
+
+
+@pytest.fixture
+def new_holdings(tmp_path, db_path):
+    """Return a function writing a CSV of the latest snapshot re-dated to `as_of`."""
+    def write(as_of, funds=None):
+        conn = duckdb.connect(str(db_path), read_only=True)
+        try:
+            snapshot = conn.execute(
+                "SELECT * FROM holdings WHERE AsOfDate = (SELECT MAX(AsOfDate) FROM holdings)"
+            ).fetchdf()
+        finally:
+            conn.close()
+        if funds is not None:
+            snapshot = snapshot[snapshot["PortfolioName"].isin(funds)]
+        snapshot["AsOfDate"] = as_of
+        path = tmp_path / f"holdings_{as_of}.csv"
+        snapshot.to_csv(path, index=False)
+        return path
+    return write
@@ -0,0 +1,103 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+
+class CursorPool:
+    """Fixed-size pool of DuckDB cursors over one database connection.
+
+    Each cursor is an independent connection to the same database instance,
+    so queries on different cursors run in parallel. A cursor is only ever
+    used by one thread at a time. `reconnect()` moves the pool to a new
+    connection.
+    """
+
+    def __init__(self, conn, size=4, acquire_timeout=30):
+        self.size = size
+        self.acquire_timeout = acquire_timeout
+        self._conn = conn
+        self._idle = queue.LifoQueue()
+        for _ in range(size):
+            self._idle.put(conn.cursor())
+        # Cleared while reconnecting, so new callers wait for the new cursors
+        self._open = threading.Event()
+        self._open.set()
+        self._lock = threading.Lock()
+        self.active = 0
+        self.acquisitions = 0
+        self.timeouts = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    @contextmanager
+    def acquire(self):
+        started = time.perf_counter()
+        try:
+            if not self._open.wait(self.acquire_timeout):
+                raise queue.Empty
+            remaining = self.acquire_timeout - (time.perf_counter() - started)
+            cursor = self._idle.get(timeout=max(remaining, 0.001))
+        except queue.Empty:
+            with self._lock:
+                self.timeouts += 1
+            raise TimeoutError(f"No DuckDB cursor available after {self.acquire_timeout}s")
+
+        waited = time.perf_counter() - started
+        with self._lock:
+            self.active += 1
+            self.acquisitions += 1
+            self.total_wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        try:
+            yield cursor
+        finally:
+            with self._lock:
+                self.active -= 1
+            self._idle.put(cursor)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": self.size,
+                "active": self.active,
+                "idle": self.size - self.active,
+                "acquisitions": self.acquisitions,
+                "timeouts": self.timeouts,
+                "avg_wait_ms": 1000 * self.total_wait_seconds / self.acquisitions if self.acquisitions else 0.0,
+                "max_wait_ms": 1000 * self.max_wait_seconds,
+            }
+
+    def reconnect(self, connect):
+        """Close every cursor and the connection, then refill from `connect()`.
+
+        Cursors in use are waited for. The old connection is closed before
+        the new one is opened, as DuckDB hands out the already open database
+        for a path while any connection to it is alive.
+        """
+        self._open.clear()
+        try:
+            drained = []
+            try:
+                for _ in range(self.size):
+                    drained.append(self._idle.get(timeout=self.acquire_timeout))
+            except queue.Empty:
+                for cursor in drained:
+                    self._idle.put(cursor)
+                raise TimeoutError(f"DuckDB cursors still in use after {self.acquire_timeout}s")
+            for cursor in drained:
+                cursor.close()
+            self._conn.close()
+            self._conn = connect()
+            for _ in range(self.size):
+                self._idle.put(self._conn.cursor())
+            return self._conn
+        finally:
+            self._open.set()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
@@ -1,25 +1,48 @@
-import pandas as pd
 import duckdb
 
-def create_reference_tables():
+from database.ingest import PROJECT_ROOT, DEFAULT_DB_PATH, ingest_file
+from database.materialize import create_materialized_tables, refresh_summaries
+from database.parquet_store import has_parquet, table_path
+from database.schema_docs import apply_comments
+
+PROCESSED_DIR = PROJECT_ROOT / "data" / "processed"
+
+def create_reference_tables(db_path=DEFAULT_DB_PATH):
     """Create pre-aggregated tables for fast queries"""
     
-    conn = duckdb.connect('../data/processed/financial_data.db')
+    conn = duckdb.connect(str(db_path))
 
-    # 1. Load cleaned CSVs
-    holdings = pd.read_csv('../data/processed/holdings_clean.csv')
-    trades = pd.read_csv('../data/processed/trades_clean.csv')
+    # 1-3. Load cleaned data into tables (with indexes), from the Parquet
+    #      store when it has been built, else from the CSVs. Safe to re-run:
+    #      rows that are already loaded are skipped.
+    for table in ("holdings", "trades"):
+        source = table_path(table) if has_parquet(table) else PROCESSED_DIR / f"{table}_clean.csv"
+        ingest_file(conn, table, source)
     
-    # 2. Create tables
-    conn.execute("CREATE TABLE holdings AS SELECT * FROM holdings")
-    conn.execute("CREATE TABLE trades AS SELECT * FROM trades")
+    print("Creating reference tables...")
+    create_views(conn)
     
-    # 3. Create indexes
-    conn.execute("CREATE INDEX idx_holdings_portfolio ON holdings(PortfolioName)")
-    conn.execute("CREATE INDEX idx_holdings_date ON holdings(AsOfDate)")
-    conn.execute("CREATE INDEX idx_trades_portfolio ON trades(PortfolioName)")
+    # 6. Column descriptions for the prompt compiler
+    apply_comments(conn)
     
-    print("Creating reference tables...")
+    # 7. Materialized copies of the latest-snapshot views
+    create_materialized_tables(conn)
+    refresh_summaries(conn)
+
+    # Verify views
+    print("\nCreated views:")
+    views = conn.execute("SHOW TABLES").fetchdf()
+    print(views)
+    
+    # Sample queries
+    print("\nSample fund summary:")
+    print(conn.execute("SELECT * FROM v_fund_summary LIMIT 5").fetchdf())
+    
+    conn.close()
+    print("\n✓ Reference tables created successfully")
+
+def create_views(conn):
+    """Create (or replace) the summary views over holdings and trades"""
     
     # 1. Fund summary (latest)
     conn.execute("""
@@ -103,18 +126,6 @@ def create_reference_tables():
             COUNT(*) as num_records
         FROM trades
     """)
-    
-    # Verify views
-    print("\nCreated views:")
-    views = conn.execute("SHOW TABLES").fetchdf()
-    print(views)
-    
-    # Sample queries
-    print("\nSample fund summary:")
-    print(conn.execute("SELECT * FROM v_fund_summary LIMIT 5").fetchdf())
-    
-    conn.close()
-    print("\n✓ Reference tables created successfully")
 
 if __name__ == "__main__":
     create_reference_tables()
\ No newline at end of file
@@ -0,0 +1,180 @@
+import argparse
+from pathlib import Path
+
+import duckdb
+
+from database.materialize import create_materialized_tables, refresh_summaries, summaries_current
+from database.swap import writable_path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_DB_PATH = PROJECT_ROOT / "data" / "processed" / "financial_data.db"
+
+# Natural keys used to skip rows that are already loaded. Holdings can have
+# several lots per key, so a key is skipped only if it already exists in the
+# table; trade allocations are unique per (id, RevisionId, AllocationId).
+SOURCES = {
+    "holdings": {
+        "date_column": "AsOfDate",
+        "keys": ["AsOfDate", "SecurityId", "PortfolioName"],
+        "dedupe_file": False,
+        "types": {"AsOfDate": "VARCHAR", "OpenDate": "VARCHAR", "CloseDate": "VARCHAR", "SecurityId": "BIGINT"},
+        "indexes": {
+            "idx_holdings_portfolio": "PortfolioName",
+            "idx_holdings_date": "AsOfDate",
+        },
+    },
+    "trades": {
+        "date_column": "TradeDate",
+        "keys": ["id", "RevisionId", "AllocationId"],
+        "dedupe_file": True,
+        "types": {"TradeDate": "VARCHAR", "SettleDate": "VARCHAR", "SecurityId": "BIGINT", "TradeFXRate": "DOUBLE"},
+        "indexes": {
+            "idx_trades_portfolio": "PortfolioName",
+        },
+    },
+}
+
+
+def ingest_file(conn, table, path):
+    """Append one CSV or Parquet file to `table`, skipping rows already loaded.
+
+    The file is read by DuckDB directly; only the staged new rows and the
+    matching snapshot dates of the existing table are touched. Returns a
+    dict with row counts and the dates/funds that changed.
+    """
+    source = SOURCES[table]
+    date_column = source["date_column"]
+    keys = source["keys"]
+
+    # 1. Stage the file
+    reader = _reader_sql(path, source)
+    conn.execute(f"CREATE OR REPLACE TEMP TABLE staging_{table} AS SELECT * FROM {reader}")
+    rows_read = conn.execute(f"SELECT COUNT(*) FROM staging_{table}").fetchone()[0]
+
+    # 2. First load creates the table and its indexes
+    if not _table_exists(conn, table):
+        conn.execute(f"CREATE TABLE {table} AS SELECT * FROM staging_{table} LIMIT 0")
+    create_indexes(conn, table)
+
+    # 3. Keep only rows whose natural key is not in the table yet. The
+    #    existing side is restricted to the staged dates.
+    key_list = ", ".join(keys)
+    staged = f"staging_{table}"
+    if source["dedupe_file"]:
+        staged = f"(SELECT DISTINCT ON ({key_list}) * FROM staging_{table})"
+    join_condition = " AND ".join(f"s.{key} IS NOT DISTINCT FROM t.{key}" for key in keys)
+    conn.execute(f"""
+        CREATE OR REPLACE TEMP TABLE new_{table} AS
+        SELECT s.* FROM {staged} s
+        WHERE NOT EXISTS (
+            SELECT 1 FROM {table} t
+            WHERE t.{date_column} IN (SELECT DISTINCT {date_column} FROM staging_{table})
+              AND {join_condition}
+        )
+    """)
+
+    # 4. Append
+    conn.execute(f"INSERT INTO {table} BY NAME SELECT * FROM new_{table}")
+    rows_inserted = conn.execute(f"SELECT COUNT(*) FROM new_{table}").fetchone()[0]
+    dates = [row[0] for row in conn.execute(f"SELECT DISTINCT {date_column} FROM new_{table}").fetchall()]
+    funds = [row[0] for row in conn.execute(f"SELECT DISTINCT PortfolioName FROM new_{table}").fetchall()]
+
+    conn.execute(f"DROP TABLE staging_{table}")
+    conn.execute(f"DROP TABLE new_{table}")
+
+    return {
+        "table": table,
+        "file": str(path),
+        "rows_read": rows_read,
+        "rows_inserted": rows_inserted,
+        "rows_skipped": rows_read - rows_inserted,
+        "dates": dates,
+        "funds": funds,
+    }
+
+
+def create_indexes(conn, table):
+    for index_name, column in SOURCES[table]["indexes"].items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table}({column})")
+
+
+def ingest(db_path=DEFAULT_DB_PATH, holdings=(), trades=(), refresh=True, swap=False):
+    """Ingest holdings/trades files and refresh the affected summaries.
+
+    The database file is written directly; with `swap` the work is done on
+    a copy that then replaces it, so a running API can keep serving, at the
+    cost of copying the whole file (see writable_path).
+    """
+    with writable_path(db_path, swap) as path:
+        conn = duckdb.connect(str(path))
+        results = []
+        try:
+            # Summaries left stale by an earlier run without a refresh are
+            # rebuilt in full; otherwise only the new dates are recomputed
+            materialized = refresh and _table_exists(conn, "mv_refresh_log")
+            if materialized:
+                create_materialized_tables(conn)
+            current = materialized and summaries_current(conn)
+            for table, paths in (("holdings", holdings), ("trades", trades)):
+                for file_path in paths:
+                    conn.execute("BEGIN TRANSACTION")
+                    try:
+                        results.append(ingest_file(conn, table, file_path))
+                        conn.execute("COMMIT")
+                    except Exception:
+                        conn.execute("ROLLBACK")
+                        raise
+
+            if materialized and not current:
+                refresh_summaries(conn)
+            elif materialized:
+                holdings_dates = sorted({d for r in results if r["table"] == "holdings" for d in r["dates"]})
+                trade_dates = sorted({d for r in results if r["table"] == "trades" for d in r["dates"]})
+                funds = sorted({f for r in results if r["table"] == "holdings" for f in r["funds"]})
+                if holdings_dates or trade_dates:
+                    refresh_summaries(conn, holdings_dates, trade_dates, funds)
+        finally:
+            conn.close()
+    return results
+
+
+def _reader_sql(path, source):
+    """DuckDB table function reading a CSV file, a Parquet file or a
+    date-partitioned Parquet directory (see database.parquet_store)."""
+    path = Path(path)
+    if path.is_dir() or path.suffix == ".parquet":
+        pattern = str(path / "**" / "*.parquet") if path.is_dir() else str(path)
+        pattern = pattern.replace("'", "''")
+        # Partition values come back as text, like the CSV date columns
+        return (
+            f"read_parquet('{pattern}', hive_partitioning = true, union_by_name = true, "
+            f"hive_types = {{'{source['date_column']}': 'VARCHAR'}})"
+        )
+    path = str(path).replace("'", "''")
+    type_spec = ", ".join(f"'{column}': '{column_type}'" for column, column_type in source["types"].items())
+    return f"read_csv('{path}', header = true, types = {{{type_spec}}})"
+
+
+def _table_exists(conn, table):
+    return conn.execute(
+        "SELECT COUNT(*) FROM duckdb_tables() WHERE table_name = ? AND NOT temporary",
+        [table]
+    ).fetchone()[0] > 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Append new holdings/trades files to the DuckDB database")
+    parser.add_argument("--db", default=str(DEFAULT_DB_PATH))
+    parser.add_argument("--holdings", nargs="*", default=[], help="Holdings CSV/Parquet files or Parquet directories")
+    parser.add_argument("--trades", nargs="*", default=[], help="Trades CSV/Parquet files or Parquet directories")
+    parser.add_argument("--no-refresh", action="store_true", help="Skip refreshing materialized summaries")
+    parser.add_argument("--swap", action="store_true",
+                        help="Update a copy of the database and rename it into place, so a running API "
+                             "can keep serving (copies the whole file)")
+    args = parser.parse_args()
+
+    for result in ingest(args.db, args.holdings, args.trades, refresh=not args.no_refresh, swap=args.swap):
+        print(
+            f"{result['table']}: {result['file']} -> "
+            f"{result['rows_inserted']:,} inserted, {result['rows_skipped']:,} skipped"
+        )
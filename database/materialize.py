@@ -0,0 +1,265 @@
+import argparse
+from datetime import datetime
+
+import duckdb
+
+from database.swap import writable_path
+
+# Materialized table -> the view it replaces. Both expose the same columns,
+# so QueryExecutor can swap one name for the other.
+MATERIALIZED_VIEWS = {
+    "mv_fund_summary": "v_fund_summary",
+    "mv_security_summary": "v_security_summary",
+    "mv_data_coverage": "v_data_coverage",
+}
+
+# Fingerprint of the loaded data: latest snapshot dates plus row counts.
+# Stored with each refresh so readers can tell a stale table from a fresh one.
+DATA_VERSION_SQL = """
+    SELECT
+        (SELECT MAX(AsOfDate) FROM holdings),
+        (SELECT COUNT(*) FROM holdings),
+        (SELECT MAX(TradeDate) FROM trades),
+        (SELECT COUNT(*) FROM trades)
+"""
+
+
+def data_version(conn):
+    return "|".join(str(value) for value in conn.execute(DATA_VERSION_SQL).fetchone())
+
+
+def summaries_current(conn):
+    """True if every materialized table was refreshed at the current data version."""
+    try:
+        fresh = conn.execute(
+            "SELECT COUNT(*) FROM mv_refresh_log WHERE data_version = ?", [data_version(conn)]
+        ).fetchone()[0]
+    except duckdb.Error:
+        # No log, or one written before data versions were recorded
+        return False
+    return fresh == len(MATERIALIZED_VIEWS)
+
+
+def create_materialized_tables(conn):
+    """Create the summary tables (empty) if they do not exist yet."""
+
+    # Per-snapshot aggregates; only touched dates are ever recomputed
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS mv_fund_summary_daily (
+            as_of_date VARCHAR,
+            PortfolioName VARCHAR,
+            num_holdings BIGINT,
+            total_market_value DOUBLE,
+            ytd_pl DOUBLE,
+            mtd_pl DOUBLE,
+            qtd_pl DOUBLE
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS mv_security_summary_daily (
+            as_of_date VARCHAR,
+            SecurityId BIGINT,
+            SecName VARCHAR,
+            SecurityTypeName VARCHAR,
+            num_funds_holding BIGINT,
+            total_quantity DOUBLE,
+            total_market_value DOUBLE
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS mv_date_counts (
+            table_name VARCHAR,
+            snapshot_date VARCHAR,
+            num_records BIGINT
+        )
+    """)
+
+    # Query-facing tables, same columns as the views they replace
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS mv_fund_summary AS
+        SELECT * FROM v_fund_summary LIMIT 0
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS mv_security_summary AS
+        SELECT * FROM v_security_summary LIMIT 0
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS mv_data_coverage AS
+        SELECT * FROM v_data_coverage LIMIT 0
+    """)
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS mv_refresh_log (
+            table_name VARCHAR PRIMARY KEY,
+            refreshed_at TIMESTAMP,
+            num_rows BIGINT
+        )
+    """)
+    # Logs written before the data version was recorded count as stale
+    conn.execute("ALTER TABLE mv_refresh_log ADD COLUMN IF NOT EXISTS data_version VARCHAR")
+
+
+def refresh_summaries(conn, holdings_dates=None, trade_dates=None, funds=None):
+    """Bring the materialized summaries up to date.
+
+    With no arguments everything is rebuilt. Otherwise only the given
+    holdings snapshot dates / trade dates are recomputed, optionally
+    restricted to `funds`; the latest-snapshot tables are then rebuilt from
+    the small per-date aggregates instead of from `holdings`.
+    """
+    full = holdings_dates is None and trade_dates is None
+    if full:
+        holdings_dates = [row[0] for row in conn.execute("SELECT DISTINCT AsOfDate FROM holdings").fetchall()]
+        trade_dates = [row[0] for row in conn.execute("SELECT DISTINCT TradeDate FROM trades").fetchall()]
+    holdings_dates = list(holdings_dates or [])
+    trade_dates = list(trade_dates or [])
+
+    conn.execute("BEGIN TRANSACTION")
+    try:
+        if full:
+            conn.execute("DELETE FROM mv_fund_summary_daily")
+            conn.execute("DELETE FROM mv_security_summary_daily")
+            conn.execute("DELETE FROM mv_date_counts")
+
+        if holdings_dates:
+            _refresh_holdings_dates(conn, holdings_dates, None if full else funds)
+        if trade_dates:
+            _refresh_date_counts(conn, "trades", "TradeDate", trade_dates)
+
+        _rebuild_latest(conn)
+
+        refreshed_at = datetime.now()
+        version = data_version(conn)
+        for table in MATERIALIZED_VIEWS:
+            num_rows = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            conn.execute(
+                "INSERT OR REPLACE INTO mv_refresh_log (table_name, refreshed_at, num_rows, data_version) "
+                "VALUES (?, ?, ?, ?)",
+                [table, refreshed_at, num_rows, version]
+            )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def _refresh_holdings_dates(conn, dates, funds):
+    fund_filter = ""
+    params = [dates]
+    if funds:
+        fund_filter = "AND PortfolioName IN (SELECT UNNEST(?::VARCHAR[]))"
+        params.append(list(funds))
+
+    conn.execute(f"""
+        DELETE FROM mv_fund_summary_daily
+        WHERE as_of_date IN (SELECT UNNEST(?::VARCHAR[])) {fund_filter}
+    """, params)
+    conn.execute(f"""
+        INSERT INTO mv_fund_summary_daily
+        SELECT
+            AsOfDate,
+            PortfolioName,
+            COUNT(DISTINCT SecurityId),
+            SUM(MV_Base),
+            SUM(PL_YTD),
+            SUM(PL_MTD),
+            SUM(PL_QTD)
+        FROM holdings
+        WHERE AsOfDate IN (SELECT UNNEST(?::VARCHAR[])) {fund_filter}
+        GROUP BY AsOfDate, PortfolioName
+    """, params)
+
+    # A security row changes when any fund holding it on that date changed
+    security_filter = ""
+    if funds:
+        security_filter = f"""
+            AND SecurityId IN (
+                SELECT SecurityId FROM holdings
+                WHERE AsOfDate IN (SELECT UNNEST(?::VARCHAR[])) {fund_filter}
+            )
+        """
+        params = [dates, dates, list(funds)]
+    conn.execute(f"""
+        DELETE FROM mv_security_summary_daily
+        WHERE as_of_date IN (SELECT UNNEST(?::VARCHAR[])) {security_filter}
+    """, params)
+    conn.execute(f"""
+        INSERT INTO mv_security_summary_daily
+        SELECT
+            AsOfDate,
+            SecurityId,
+            SecName,
+            SecurityTypeName,
+            COUNT(DISTINCT PortfolioName),
+            SUM(Qty),
+            SUM(MV_Base)
+        FROM holdings
+        WHERE AsOfDate IN (SELECT UNNEST(?::VARCHAR[])) {security_filter}
+        GROUP BY AsOfDate, SecurityId, SecName, SecurityTypeName
+    """, params)
+
+    _refresh_date_counts(conn, "holdings", "AsOfDate", dates)
+
+
+def _refresh_date_counts(conn, table_name, date_column, dates):
+    conn.execute("""
+        DELETE FROM mv_date_counts
+        WHERE table_name = ? AND snapshot_date IN (SELECT UNNEST(?::VARCHAR[]))
+    """, [table_name, dates])
+    conn.execute(f"""
+        INSERT INTO mv_date_counts
+        SELECT ?, {date_column}, COUNT(*)
+        FROM {table_name}
+        WHERE {date_column} IN (SELECT UNNEST(?::VARCHAR[]))
+        GROUP BY {date_column}
+    """, [table_name, dates])
+
+
+def _rebuild_latest(conn):
+    conn.execute("DELETE FROM mv_fund_summary")
+    conn.execute("""
+        INSERT INTO mv_fund_summary
+        SELECT PortfolioName, num_holdings, total_market_value, ytd_pl, mtd_pl, qtd_pl, as_of_date
+        FROM mv_fund_summary_daily
+        WHERE as_of_date = (SELECT MAX(as_of_date) FROM mv_fund_summary_daily)
+    """)
+
+    conn.execute("DELETE FROM mv_security_summary")
+    conn.execute("""
+        INSERT INTO mv_security_summary
+        SELECT SecurityId, SecName, SecurityTypeName, num_funds_holding, total_quantity, total_market_value
+        FROM mv_security_summary_daily
+        WHERE as_of_date = (SELECT MAX(as_of_date) FROM mv_security_summary_daily)
+    """)
+
+    conn.execute("DELETE FROM mv_data_coverage")
+    conn.execute("""
+        INSERT INTO mv_data_coverage
+        SELECT
+            table_name,
+            MIN(snapshot_date),
+            MAX(snapshot_date),
+            COUNT(*),
+            SUM(num_records)
+        FROM mv_date_counts
+        GROUP BY table_name
+        ORDER BY table_name
+    """)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create and refresh materialized summary tables")
+    parser.add_argument("--db", default="data/processed/financial_data.db")
+    parser.add_argument("--swap", action="store_true",
+                        help="Update a copy of the database and rename it into place, so a running API "
+                             "can keep serving (copies the whole file)")
+    args = parser.parse_args()
+
+    with writable_path(args.db, args.swap) as path:
+        conn = duckdb.connect(str(path))
+        try:
+            create_materialized_tables(conn)
+            refresh_summaries(conn)
+            print(conn.execute("SELECT * FROM mv_refresh_log").fetchdf())
+        finally:
+            conn.close()
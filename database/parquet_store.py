@@ -0,0 +1,137 @@
+import argparse
+import shutil
+import uuid
+from pathlib import Path
+
+import duckdb
+
+from database.ingest import PROJECT_ROOT, SOURCES, _reader_sql
+
+# data/parquet/holdings/AsOfDate=2023-01-08/data_<uuid>.parquet
+# data/parquet/trades/TradeDate=2026-01-13/data_<uuid>.parquet
+PARQUET_DIR = PROJECT_ROOT / "data" / "parquet"
+PROCESSED_DIR = PROJECT_ROOT / "data" / "processed"
+
+
+def table_path(table, root=PARQUET_DIR):
+    return Path(root) / table
+
+
+def has_parquet(table, root=PARQUET_DIR):
+    return any(table_path(table, root).glob("*/*.parquet"))
+
+
+def reader_sql(table, root=PARQUET_DIR):
+    """read_parquet(...) over one table's partitions.
+
+    DuckDB prunes partitions from filters on the date column and reads only
+    the projected columns, e.g.
+    SELECT PortfolioName, MV_Base FROM {reader_sql('holdings')} WHERE AsOfDate = '2023-01-08'.
+    """
+    return _reader_sql(table_path(table, root), SOURCES[table])
+
+
+def write_partitions(conn, table, source, root=PARQUET_DIR):
+    """Write `source` (a CSV/Parquet path) into the table's partitioned layout.
+
+    Rows are merged into the existing partitions of their snapshot date;
+    stored rows whose natural key is in the file are replaced, so
+    re-converting a file is safe and a second file for a date adds to it.
+    The merged partitions are written to a temp directory and renamed into
+    place, so a failed write leaves the old ones intact. Returns the dates
+    written.
+    """
+    config = SOURCES[table]
+    date_column = config["date_column"]
+    key_list = ", ".join(config["keys"])
+    target = table_path(table, root)
+
+    # 1. Stage the file; trade files can repeat allocations
+    reader = _reader_sql(source, config)
+    staged = f"SELECT * FROM {reader}"
+    if config["dedupe_file"]:
+        staged = f"SELECT DISTINCT ON ({key_list}) * FROM {reader}"
+    conn.execute(f"CREATE OR REPLACE TEMP TABLE parquet_staging_{table} AS {staged}")
+    dates = [
+        row[0] for row in
+        conn.execute(f"SELECT DISTINCT {date_column} FROM parquet_staging_{table} ORDER BY 1").fetchall()
+    ]
+
+    # 2. Keep the rows already stored for those dates whose natural key is
+    #    not in the file, like database.ingest does for the database
+    merged = f"SELECT * FROM parquet_staging_{table}"
+    existing = [date for date in dates if (target / f"{date_column}={date}").exists()]
+    if existing:
+        date_list = ", ".join("'" + str(date).replace("'", "''") + "'" for date in existing)
+        merged = f"""
+            {merged}
+            UNION ALL BY NAME
+            SELECT * FROM {reader_sql(table, root)} AS stored
+            WHERE {date_column} IN ({date_list})
+              AND NOT EXISTS (
+                  SELECT 1 FROM parquet_staging_{table} AS staged
+                  WHERE {" AND ".join(f"staged.{key} = stored.{key}" for key in config["keys"])}
+              )
+        """
+
+    # 3. One zstd file per date in a temp directory, sorted so row groups
+    #    cluster by fund
+    temp = target.parent / f".{table}_{uuid.uuid4().hex}"
+    temp.mkdir(parents=True)
+    try:
+        conn.execute(f"""
+            COPY (
+                SELECT * FROM ({merged})
+                ORDER BY {date_column}, PortfolioName
+            ) TO '{str(temp).replace("'", "''")}' (
+                FORMAT PARQUET,
+                COMPRESSION ZSTD,
+                PARTITION_BY ({date_column}),
+                FILENAME_PATTERN 'data_{uuid.uuid4().hex}_{{i}}'
+            )
+        """)
+
+        # 4. Swap each date's partition for the merged one
+        target.mkdir(parents=True, exist_ok=True)
+        for date in dates:
+            name = f"{date_column}={date}"
+            partition = target / name
+            if partition.exists():
+                old = temp / f"{name}.old"
+                partition.rename(old)
+            (temp / name).rename(partition)
+    finally:
+        shutil.rmtree(temp, ignore_errors=True)
+        conn.execute(f"DROP TABLE IF EXISTS parquet_staging_{table}")
+    return dates
+
+
+def convert_csvs(holdings=(), trades=(), root=PARQUET_DIR):
+    """Convert CSV files into the partitioned Parquet layout."""
+    conn = duckdb.connect()
+    results = []
+    try:
+        for table, paths in (("holdings", holdings), ("trades", trades)):
+            for path in paths:
+                dates = write_partitions(conn, table, path, root)
+                results.append({"table": table, "file": str(path), "dates": dates})
+    finally:
+        conn.close()
+    return results
+
+
+def disk_usage(table, root=PARQUET_DIR):
+    return sum(path.stat().st_size for path in table_path(table, root).glob("*/*.parquet"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert cleaned CSVs to date-partitioned Parquet (zstd)")
+    parser.add_argument("--holdings", nargs="*", default=[str(PROCESSED_DIR / "holdings_clean.csv")])
+    parser.add_argument("--trades", nargs="*", default=[str(PROCESSED_DIR / "trades_clean.csv")])
+    parser.add_argument("--root", default=str(PARQUET_DIR))
+    args = parser.parse_args()
+
+    for result in convert_csvs(args.holdings, args.trades, args.root):
+        print(f"{result['table']}: {result['file']} -> {len(result['dates'])} partition(s)")
+    for table in SOURCES:
+        print(f"{table}: {disk_usage(table, args.root) / 2**20:.2f} MB in {table_path(table, args.root)}")
@@ -1,25 +1,410 @@
+import asyncio
+import functools
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import duckdb
+import pyarrow as pa
+
+from core.metrics import DUCKDB_SECONDS, RESULT_ROWS
+from database.connection_pool import CursorPool
+from database.materialize import MATERIALIZED_VIEWS, data_version
+from database.result_cache import ResultCache
+from database.sql_guard import SQLGuard, canonical_sql
+
+# Views that are expensive enough to share across a batch of queries
+SHARED_VIEWS = {"v_fund_summary", "v_trade_summary", "v_security_summary", "v_data_coverage"}
+
+# Base tables the UI can page through
+BROWSE_TABLES = ("holdings", "trades")
 
 class QueryExecutor:
-    def __init__(self, db_path):
-        self.conn = duckdb.connect(db_path, read_only=True)
+    def __init__(self, db_path, pool_size=4, duckdb_threads=None, version_check_seconds=5,
+                 max_rows=1000, max_bytes=8 * 1024 * 1024, timeout_seconds=10,
+                 result_cache_bytes=64 * 1024 * 1024):
+        self.db_path = db_path
+        self.pool_size = pool_size
+        self._config = {"threads": duckdb_threads} if duckdb_threads else {}
+        self.reopens = 0
+        self.conn = self._connect()
+        # One cursor per worker thread: DuckDB runs queries on different
+        # cursors in parallel, and async callers never wait on the event loop
+        self.cursors = CursorPool(self.conn, size=pool_size)
+        # Filled in by data_version() once the loaded data is known
+        self.view_map = {}
+        self._columns = {}
+        self.duckdb_threads = self.conn.execute("SELECT current_setting('threads')").fetchone()[0]
+        self.pool = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="duckdb")
+        self.version_check_seconds = version_check_seconds
+        self._version = None
+        self._version_checked_at = 0.0
+        self._version_lock = threading.Lock()
+        # One row over the cap so a truncated result can be told apart
+        self.guard = SQLGuard(max_rows=max_rows + 1, timeout_seconds=timeout_seconds)
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        # Results of earlier queries for the current data version; 0 disables
+        self.results = ResultCache(max_bytes=result_cache_bytes) if result_cache_bytes else None
+
+    def _connect(self):
+        self._file_id = _file_id(self.db_path)
+        return duckdb.connect(self.db_path, read_only=True, config=self._config)
+
+    def _reopen_if_replaced(self):
+        """Open the database again if ingest swapped in a new file.
+
+        Queries already running finish first; new ones wait for the new
+        connection.
+        """
+        if _file_id(self.db_path) != self._file_id:
+            self.conn = self.cursors.reconnect(self._connect)
+            self.view_map = {}
+            self._columns = {}
+            self.reopens += 1
+
+    def _load_view_map(self, cursor, version):
+        """Views whose materialized table was refreshed at data `version`.
+
+        After an ingest without a refresh the tables are behind the base
+        tables, and the views are read instead.
+        """
+        try:
+            rows = cursor.execute(
+                "SELECT table_name FROM mv_refresh_log WHERE data_version = ?", [version]
+            ).fetchall()
+        except duckdb.Error:
+            return {}
+        return {
+            MATERIALIZED_VIEWS[table]: table
+            for (table,) in rows
+            if table in MATERIALIZED_VIEWS
+        }
+
+    def _use_materialized(self, sql):
+        for view, table in self.view_map.items():
+            sql = re.sub(rf"\b{view}\b", table, sql, flags=re.IGNORECASE)
+        return sql
+
+    def data_version(self):
+        """Fingerprint of the loaded data: latest snapshot dates plus row counts.
+
+        Re-read at most every `version_check_seconds` so callers can use it on
+        every request, after reopening the database if its file was replaced.
+        """
+        with self._version_lock:
+            now = time.monotonic()
+            if self._version is None or now - self._version_checked_at > self.version_check_seconds:
+                self._reopen_if_replaced()
+                with self.cursors.acquire() as cursor:
+                    version = data_version(cursor)
+                    if version != self._version or not self.view_map:
+                        self.view_map = self._load_view_map(cursor, version)
+                self._version = version
+                self._version_checked_at = now
+            return self._version
     
-    def execute(self, sql):
-        # Safety check
-        if not sql.upper().strip().startswith('SELECT'):
-            return {"error": "Only SELECT allowed", "data": None}
-        
-        # Block dangerous keywords
-        dangerous = ['DROP', 'DELETE', 'INSERT', 'UPDATE', 'ALTER']
-        if any(word in sql.upper() for word in dangerous):
-            return {"error": "Dangerous operation blocked", "data": None}
-        
+    def ping(self):
+        with self.cursors.acquire() as cursor:
+            cursor.execute("SELECT 1").fetchone()
+
+    def fund_names(self):
+        with self.cursors.acquire() as cursor:
+            rows = cursor.execute("""
+                SELECT DISTINCT PortfolioName FROM holdings
+                UNION
+                SELECT DISTINCT PortfolioName FROM trades
+            """).fetchall()
+        return [row[0] for row in rows if row[0]]
+
+    def entity_values(self):
+        """(kind, column, value) for every distinct fund, security name and identifier."""
+        with self.cursors.acquire() as cursor:
+            rows = cursor.execute("""
+                SELECT 'fund', 'PortfolioName', PortfolioName FROM holdings
+                UNION SELECT 'fund', 'PortfolioName', PortfolioName FROM trades
+                UNION SELECT 'security', 'SecName', SecName FROM holdings
+                UNION SELECT 'security', 'Name', Name FROM trades
+                UNION SELECT 'security_id', 'SecurityId', CAST(SecurityId AS VARCHAR) FROM holdings
+                UNION SELECT 'security_id', 'SecurityId', CAST(SecurityId AS VARCHAR) FROM trades
+                UNION SELECT 'ticker', 'Ticker', Ticker FROM trades
+                UNION SELECT 'cusip', 'CUSIP', CUSIP FROM trades
+                ORDER BY 1, 2, 3
+            """).fetchall()
+        return [row for row in rows if row[2]]
+
+    def execute(self, sql, relations=None):
+        """Run one generated query.
+
+        `relations` maps extra table names to Arrow tables the query may
+        read as well (a session's earlier results). They are registered on
+        the cursor for this query only, and such queries are not cached.
+        """
+        # Safety check: single SELECT over known tables, row cap applied
+        guard = self.guard
+        if relations:
+            guard = SQLGuard(
+                self.guard.allowed_tables | set(relations), max_rows=self.guard.max_rows,
+                max_estimated_rows=self.guard.max_estimated_rows, timeout_seconds=self.guard.timeout_seconds
+            )
+        sql, error = guard.check(sql)
+        if error:
+            return {"error": error, "data": None}
+
+        cache_key = None
+        if not relations:
+            cached, cache_key = self._cached(sql)
+            if cached is not None:
+                return cached
+
         try:
-            result = self.conn.execute(sql).fetchdf()
-            
-            if result.empty:
-                return {"error": "No data found", "data": None}
-            
-            return {"error": None, "data": result}
+            with self.cursors.acquire() as cursor:
+                for name, table in (relations or {}).items():
+                    cursor.register(name, table)
+                try:
+                    return self._run(cursor, sql, self._use_materialized(sql), cache_key)
+                finally:
+                    for name in relations or {}:
+                        cursor.unregister(name)
         except Exception as e:
-            return {"error": str(e), "data": None}
\ No newline at end of file
+            return {"error": str(e), "data": None}
+
+    def execute_many(self, sqls):
+        """Execute several queries in one pass over the summary views.
+
+        Identical queries run once. A summary view read by more than one
+        query is computed once, kept as an Arrow table for the duration of
+        the batch, and every query reads that copy instead. The copy goes
+        through the same guard, cost check and timeout as a query; a view
+        that fails them or exceeds the row/byte budget is not shared.
+        """
+        unique = list(dict.fromkeys(sql.strip().rstrip(";") for sql in sqls))
+        checked = {sql: self.guard.check(sql) for sql in unique}
+
+        view_usage = {}
+        for sql, (guarded_sql, error) in checked.items():
+            if error is None:
+                for table in self.guard.referenced_tables(sql):
+                    if table in SHARED_VIEWS:
+                        view_usage[table] = view_usage.get(table, 0) + 1
+        shared = [view for view, count in view_usage.items() if count > 1]
+
+        results = {}
+        cache_keys = {}
+        for sql, (guarded_sql, error) in checked.items():
+            if error is None:
+                cached, cache_keys[sql] = self._cached(guarded_sql)
+                if cached is not None:
+                    results[sql] = cached
+        try:
+            with self.cursors.acquire() as cursor:
+                snapshots = {view: self._snapshot(cursor, view) for view in shared}
+                shared = [view for view in shared if snapshots[view] is not None]
+                for view in shared:
+                    cursor.register(f"batch_{view}", snapshots[view])
+                try:
+                    for sql, (guarded_sql, error) in checked.items():
+                        if sql in results:
+                            continue
+                        if error:
+                            results[sql] = {"error": error, "data": None}
+                            continue
+                        fast_sql = guarded_sql
+                        for view in shared:
+                            fast_sql = re.sub(rf"\b{view}\b", f"batch_{view}", fast_sql, flags=re.IGNORECASE)
+                        try:
+                            results[sql] = self._run(
+                                cursor, guarded_sql, self._use_materialized(fast_sql), cache_keys[sql]
+                            )
+                        except Exception as e:
+                            results[sql] = {"error": str(e), "data": None}
+                finally:
+                    for view in shared:
+                        cursor.unregister(f"batch_{view}")
+        except Exception as e:
+            return [{"error": str(e), "data": None} for _ in sqls]
+
+        return [results[sql.strip().rstrip(";")] for sql in sqls]
+
+    def _snapshot(self, cursor, view):
+        """The whole of `view` as an Arrow table, or None if it cannot be
+        read within the guard's limits."""
+        sql, error = self.guard.check(f"SELECT * FROM {view}")
+        if error:
+            return None
+        fast_sql = self._use_materialized(sql)
+        try:
+            if self.guard.check_cost(cursor, fast_sql):
+                return None
+            with DUCKDB_SECONDS.time(), self.guard.deadline(cursor):
+                table, truncated = self._fetch_arrow(cursor.execute(fast_sql))
+        except duckdb.Error:
+            return None
+        # A cut-off copy would give the batch's queries wrong answers
+        return None if truncated else table
+
+    def table_columns(self, table):
+        if table not in self._columns:
+            with self.cursors.acquire() as cursor:
+                rows = cursor.execute(
+                    "SELECT column_name FROM duckdb_columns() WHERE table_name = ? ORDER BY column_index",
+                    [table]
+                ).fetchall()
+            self._columns[table] = [row[0] for row in rows]
+        return self._columns[table]
+
+    def browse(self, table, columns=None, filters=None, limit=100, offset=0, after=None, count=False):
+        """One page of a base table, for browsing rather than answering.
+
+        Pages are in storage (rowid) order. Pass the previous page's
+        `next_cursor` as `after` for keyset paging, which costs the same on
+        every page; `offset` is for jumping to a page. `filters` are
+        {column: value} equality filters. Returns a dict with an Arrow
+        `table`, `next_cursor` (None on the last page) and, with `count`,
+        the number of matching rows.
+        """
+        if table not in BROWSE_TABLES:
+            return {"error": f"Unknown table: {table}", "table": None}
+        known = self.table_columns(table)
+        columns = list(columns or known)
+        filters = filters or {}
+        unknown = [column for column in [*columns, *filters] if column not in known]
+        if unknown:
+            return {"error": f"Unknown column(s): {', '.join(unknown)}", "table": None}
+        limit = max(1, min(int(limit), self.max_rows))
+
+        # 1. Identifiers come from the catalog, values are bound parameters
+        conditions = [f'"{column}" = ?' for column in filters]
+        params = list(filters.values())
+        total_sql = f"SELECT COUNT(*) FROM {table}"
+        if conditions:
+            total_sql += " WHERE " + " AND ".join(conditions)
+        total_params = list(params)
+        if after is not None:
+            conditions.append("rowid > ?")
+            params.append(int(after))
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+        projection = ", ".join(f'"{column}"' for column in columns)
+        # One extra row tells whether there is a next page
+        sql = f"SELECT rowid AS _row_id, {projection} FROM {table}{where} ORDER BY rowid LIMIT {limit + 1}"
+        if after is None and offset:
+            sql += f" OFFSET {max(0, int(offset))}"
+
+        # 2. Run it
+        try:
+            with self.cursors.acquire() as cursor:
+                with DUCKDB_SECONDS.time(), self.guard.deadline(cursor):
+                    page = cursor.execute(sql, params).fetch_arrow_table()
+                    total = cursor.execute(total_sql, total_params).fetchone()[0] if count else None
+        except duckdb.InterruptException:
+            return {"error": f"Query timed out after {self.guard.timeout_seconds}s", "table": None}
+        except duckdb.Error as e:
+            return {"error": str(e), "table": None}
+
+        next_cursor = None
+        if page.num_rows > limit:
+            page = page.slice(0, limit)
+            next_cursor = page.column("_row_id")[-1].as_py()
+        return {
+            "error": None,
+            "table": page.drop_columns(["_row_id"]),
+            "next_cursor": next_cursor,
+            "total": total,
+        }
+
+    async def browse_async(self, table, **kwargs):
+        return await self.run_async(functools.partial(self.browse, table, **kwargs))
+
+    def _cached(self, sql):
+        """(result, None) for a cached guarded query, else (None, cache key)."""
+        if self.results is None:
+            return None, None
+        key = (canonical_sql(sql), self.data_version())
+        hit = self.results.get(*key)
+        if hit is None:
+            return None, key
+        return self._result(*hit), None
+
+    def _run(self, cursor, sql, fast_sql, cache_key=None):
+        """Run a guarded query, preferring `fast_sql` and falling back to `sql`.
+
+        With a `cache_key`, the fetched Arrow table is kept in the result cache.
+        """
+        try:
+            error = self.guard.check_cost(cursor, fast_sql)
+            if error and fast_sql != sql:
+                # Fall back to the live views
+                fast_sql = sql
+                error = self.guard.check_cost(cursor, sql)
+            if error:
+                return {"error": error, "data": None}
+
+            with DUCKDB_SECONDS.time(), self.guard.deadline(cursor):
+                table, truncated = self._fetch_arrow(cursor.execute(fast_sql))
+        except duckdb.InterruptException:
+            return {"error": f"Query timed out after {self.guard.timeout_seconds}s", "data": None}
+
+        RESULT_ROWS.observe(table.num_rows)
+        if cache_key is not None:
+            self.results.set(*cache_key, table, truncated)
+        return self._result(table, truncated)
+
+    def _result(self, table, truncated):
+        if table.num_rows == 0:
+            return {"error": "No data found", "data": None}
+
+        return {
+            "error": None,
+            "data": table.to_pandas(),
+            "truncated": truncated,
+            "row_count": table.num_rows,
+        }
+
+    def _fetch_arrow(self, relation, batch_size=1024):
+        """Read record batches until the row or byte budget is reached."""
+        reader = relation.fetch_record_batch(batch_size)
+        batches, rows, size = [], 0, 0
+        truncated = False
+        for batch in reader:
+            if rows >= self.max_rows or size >= self.max_bytes:
+                truncated = True
+                break
+            if rows + batch.num_rows > self.max_rows:
+                batch = batch.slice(0, self.max_rows - rows)
+                truncated = True
+            batches.append(batch)
+            rows += batch.num_rows
+            size += batch.nbytes
+        return pa.Table.from_batches(batches, schema=reader.schema), truncated
+
+    async def execute_async(self, sql, relations=None):
+        return await self.run_async(self.execute, sql, relations)
+
+    async def execute_many_async(self, sqls):
+        return await self.run_async(self.execute_many, sqls)
+
+    def pool_stats(self):
+        stats = self.cursors.stats()
+        stats["duckdb_threads"] = self.duckdb_threads
+        stats["reopens"] = self.reopens
+        return stats
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+        self.cursors.close()
+        self.conn.close()
+
+    async def run_async(self, func, *args):
+        """Run a blocking DuckDB call on the executor's thread pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.pool, func, *args)
+
+
+def _file_id(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
@@ -0,0 +1,78 @@
+import threading
+from collections import OrderedDict
+
+
+class ResultCache:
+    """LRU cache of query results as Arrow tables, bounded by memory.
+
+    Keys are (data_version, canonical SQL). Entries for an older data
+    version can never be hit again, so they are dropped as soon as a result
+    for a newer version is stored.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_entries=1024):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, sql, data_version):
+        """Return (table, truncated) or None."""
+        key = (data_version, sql)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], entry[1]
+
+    def set(self, sql, data_version, table, truncated=False):
+        # One contiguous chunk per column: smaller and faster to convert
+        table = table.combine_chunks()
+        size = table.nbytes
+        if size > self.max_bytes:
+            return
+
+        key = (data_version, sql)
+        with self._lock:
+            if data_version != self._version:
+                self._entries.clear()
+                self._bytes = 0
+                self._version = data_version
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (table, truncated, size)
+            self._bytes += size
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
@@ -0,0 +1,102 @@
+# Descriptions of the tables and views the LLM may query. They are written
+# into the DuckDB catalog with COMMENT ON (see apply_comments) so the prompt
+# compiler can read them back alongside the live column list.
+
+TABLE_DOCS = {
+    "v_fund_summary": (
+        "One row per fund, LATEST holdings snapshot only. Use for fund performance, "
+        "comparing funds, best/worst funds, holdings count and AUM."
+    ),
+    "v_trade_summary": (
+        "One row per fund, aggregated over ALL trades. Use for trading activity, "
+        "cash flow and trade frequency."
+    ),
+    "v_security_summary": (
+        "One row per security, LATEST holdings snapshot only. Use for top securities, "
+        "cross-fund exposure and concentration."
+    ),
+    "v_data_coverage": (
+        "Metadata view, one row per base table. Use for data availability and coverage questions."
+    ),
+    "holdings": "Base table of daily holdings snapshots. Use only if no view can answer.",
+    "trades": "Base table of individual trade allocations. Use only if no view can answer.",
+}
+
+COLUMN_DOCS = {
+    "v_fund_summary": {
+        "PortfolioName": "Name of the fund / portfolio",
+        "num_holdings": "Number of distinct securities held by the fund",
+        "total_market_value": "Total market value (AUM) of the fund",
+        "ytd_pl": "Year-To-Date profit and loss of the fund",
+        "mtd_pl": "Month-To-Date profit and loss of the fund",
+        "qtd_pl": "Quarter-To-Date profit and loss of the fund",
+        "as_of_date": "Date of the holdings snapshot",
+    },
+    "v_trade_summary": {
+        "PortfolioName": "Name of the fund",
+        "num_trades": "Total number of trades executed",
+        "total_cash_flow": "Net cash inflow (+) or outflow (-) from trades",
+        "avg_trade_size": "Average absolute cash value per trade",
+        "first_trade_date": "Date of earliest trade",
+        "last_trade_date": "Date of most recent trade",
+    },
+    "v_security_summary": {
+        "SecurityId": "Unique security identifier",
+        "SecName": "Security name",
+        "SecurityTypeName": "Type of security (Equity, Bond, etc.)",
+        "num_funds_holding": "Number of funds holding this security",
+        "total_quantity": "Total quantity held across all funds",
+        "total_market_value": "Total market value across all funds",
+    },
+    "v_data_coverage": {
+        "table_name": "Source table name",
+        "start_date": "Earliest available date",
+        "end_date": "Latest available date",
+        "num_dates": "Number of distinct dates available",
+        "num_records": "Total number of records",
+    },
+    "holdings": {
+        "PortfolioName": "Fund name",
+        "AsOfDate": "Holdings snapshot date (YYYY-MM-DD text)",
+        "SecurityId": "Security identifier",
+        "SecName": "Security name",
+        "SecurityTypeName": "Security type (Equity, Bond, etc.)",
+        "DirectionName": "Long or Short",
+        "CustodianName": "Custodian holding the position",
+        "Qty": "Quantity held",
+        "Price": "Price of the security",
+        "MV_Base": "Market value in base currency",
+        "PL_DTD": "Day-to-date profit/loss",
+        "PL_YTD": "Year-to-date profit/loss",
+        "PL_MTD": "Month-to-date profit/loss",
+        "PL_QTD": "Quarter-to-date profit/loss",
+    },
+    "trades": {
+        "PortfolioName": "Fund name",
+        "TradeDate": "Trade execution date (YYYY-MM-DD text)",
+        "TradeTypeName": "Buy, Sell, etc.",
+        "SecurityId": "Security identifier",
+        "Name": "Security name",
+        "Ticker": "Ticker symbol",
+        "CUSIP": "CUSIP identifier",
+        "Quantity": "Quantity traded",
+        "Price": "Trade price",
+        "TotalCash": "Cash value of trade",
+        "Counterparty": "Trade counterparty",
+    },
+}
+
+
+def apply_comments(conn):
+    """Store TABLE_DOCS / COLUMN_DOCS as catalog comments."""
+    views = {row[0] for row in conn.execute("SELECT view_name FROM duckdb_views() WHERE NOT internal").fetchall()}
+    for table, comment in TABLE_DOCS.items():
+        kind = "VIEW" if table in views else "TABLE"
+        conn.execute(f"COMMENT ON {kind} {table} IS {_quote(comment)}")
+    for table, columns in COLUMN_DOCS.items():
+        for column, comment in columns.items():
+            conn.execute(f"COMMENT ON COLUMN {table}.{column} IS {_quote(comment)}")
+
+
+def _quote(value):
+    return "'" + value.replace("'", "''") + "'"
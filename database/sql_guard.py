@@ -0,0 +1,196 @@
+import json
+import re
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+
+import duckdb
+
+ALLOWED_TABLES = {
+    "holdings", "trades",
+    "v_fund_summary", "v_trade_summary", "v_security_summary", "v_data_coverage",
+    "mv_fund_summary", "mv_security_summary", "mv_data_coverage",
+}
+
+# Scalar functions that reach outside the database
+FORBIDDEN_FUNCTIONS = {"getenv", "read_text", "read_blob", "glob", "query", "query_table"}
+
+_parser = duckdb.connect(":memory:")
+_parser_lock = threading.Lock()
+
+
+class SQLGuard:
+    """Validates generated SQL on DuckDB's own parse tree before it runs.
+
+    Only single SELECT statements (including WITH / UNION) over whitelisted
+    tables pass. Results are capped with a LIMIT, plans whose estimated
+    cardinality is too large are rejected, and execution is interrupted
+    after `timeout_seconds`.
+    """
+
+    def __init__(self, allowed_tables=ALLOWED_TABLES, max_rows=1000,
+                 max_estimated_rows=50_000_000, timeout_seconds=10):
+        self.allowed_tables = frozenset(table.lower() for table in allowed_tables)
+        self.max_rows = max_rows
+        self.max_estimated_rows = max_estimated_rows
+        self.timeout_seconds = timeout_seconds
+
+    def check(self, sql):
+        """Return (guarded_sql, None) or (None, error message)."""
+        guarded_sql, error, _ = _analyze(sql.strip().rstrip(";"), self.allowed_tables, self.max_rows)
+        return guarded_sql, error
+
+    def referenced_tables(self, sql):
+        """Tables and views read by an (accepted) query."""
+        return _analyze(sql.strip().rstrip(";"), self.allowed_tables, self.max_rows)[2]
+
+    def check_cost(self, cursor, sql):
+        """Return an error message if the plan is estimated to be too large."""
+        try:
+            plan = cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}").fetchall()[0][1]
+        except duckdb.Error as e:
+            return str(e)
+        estimate = max(_cardinalities(json.loads(plan)), default=0)
+        if estimate > self.max_estimated_rows:
+            return f"Query too expensive (~{estimate:,} estimated rows)"
+        return None
+
+    @contextmanager
+    def deadline(self, cursor):
+        """Interrupt the query running on `cursor` once the timeout passes."""
+        timer = threading.Timer(self.timeout_seconds, cursor.interrupt)
+        timer.daemon = True
+        timer.start()
+        try:
+            yield
+        finally:
+            timer.cancel()
+
+
+@lru_cache(maxsize=2048)
+def canonical_sql(sql):
+    """One spelling per query, for cache keys.
+
+    DuckDB re-renders the parse tree, which fixes whitespace, keyword case,
+    parentheses and literal syntax (DATE '...' and CAST('...' AS DATE) come
+    out the same). Table names and the column names in filters, grouping
+    and ordering are lower-cased; select-list names are kept because they
+    name the result columns.
+    """
+    sql = sql.strip().rstrip(";")
+    with _parser_lock:
+        tree = json.loads(_parser.execute("SELECT json_serialize_sql(?)", [sql]).fetchone()[0])
+    if tree.get("error"):
+        return " ".join(sql.split())
+    _lowercase_names(tree["statements"], False)
+    with _parser_lock:
+        return _parser.execute("SELECT json_deserialize_sql(?)", [json.dumps(tree)]).fetchone()[0]
+
+
+# Parts of a query whose column names do not reach the result
+_UNNAMED_CLAUSES = {"where_clause", "having", "qualify", "group_expressions", "modifiers", "condition"}
+
+
+def _lowercase_names(node, in_clause):
+    if isinstance(node, list):
+        for child in node:
+            _lowercase_names(child, in_clause)
+        return
+    if not isinstance(node, dict):
+        return
+
+    if node.get("type") == "BASE_TABLE":
+        node["table_name"] = node["table_name"].lower()
+    elif node.get("class") == "COLUMN_REF" and in_clause:
+        node["column_names"] = [name.lower() for name in node["column_names"]]
+
+    for key, value in node.items():
+        if isinstance(value, (dict, list)):
+            _lowercase_names(value, in_clause or key in _UNNAMED_CLAUSES)
+
+
+@lru_cache(maxsize=2048)
+def _analyze(sql, allowed_tables, max_rows):
+    with _parser_lock:
+        tree = json.loads(_parser.execute("SELECT json_serialize_sql(?)", [sql]).fetchone()[0])
+
+    if tree.get("error"):
+        if "Only SELECT" in tree.get("error_message", ""):
+            return None, "Only SELECT allowed", frozenset()
+        return None, f"Invalid SQL: {tree.get('error_message')}", frozenset()
+    if len(tree["statements"]) != 1:
+        return None, "Only a single statement is allowed", frozenset()
+
+    node = tree["statements"][0]["node"]
+    tables, ctes, functions, table_functions = set(), set(), set(), set()
+    _collect(node, tables, ctes, functions, table_functions)
+
+    if table_functions:
+        return None, f"Table functions are not allowed: {', '.join(sorted(table_functions))}", frozenset()
+    forbidden = functions & FORBIDDEN_FUNCTIONS
+    if forbidden:
+        return None, f"Functions are not allowed: {', '.join(sorted(forbidden))}", frozenset()
+    unknown = tables - ctes - allowed_tables
+    if unknown:
+        return None, f"Unknown or restricted tables: {', '.join(sorted(unknown))}", frozenset()
+
+    # Cap the result size. The query's own LIMIT is never rewritten (it may
+    # be an expression, or come with an OFFSET); the query is wrapped instead.
+    # Newlines keep a trailing "--" comment from swallowing the parenthesis.
+    limit = _limit_value(node)
+    if limit is None or limit > max_rows:
+        sql = f"SELECT * FROM (\n{sql}\n) AS capped LIMIT {max_rows}"
+
+    return sql, None, frozenset(tables - ctes)
+
+
+def _collect(node, tables, ctes, functions, table_functions):
+    if isinstance(node, list):
+        for child in node:
+            _collect(child, tables, ctes, functions, table_functions)
+        return
+    if not isinstance(node, dict):
+        return
+
+    node_type = node.get("type")
+    if node_type == "BASE_TABLE":
+        name = node["table_name"].lower()
+        if node.get("schema_name") not in ("", "main") or node.get("catalog_name"):
+            name = f"{node.get('catalog_name')}.{node.get('schema_name')}.{name}".strip(".")
+        tables.add(name)
+    elif node_type == "TABLE_FUNCTION":
+        table_functions.add(node["function"]["function_name"].lower())
+    elif node.get("class") == "FUNCTION":
+        functions.add(node["function_name"].lower())
+
+    cte_map = node.get("cte_map")
+    if cte_map:
+        ctes.update(entry["key"].lower() for entry in cte_map["map"])
+
+    for value in node.values():
+        if isinstance(value, (dict, list)):
+            _collect(value, tables, ctes, functions, table_functions)
+
+
+def _limit_value(node):
+    for modifier in node.get("modifiers", []):
+        if modifier["type"] == "LIMIT_MODIFIER" and modifier.get("limit"):
+            limit = modifier["limit"]
+            if limit.get("class") == "CONSTANT" and not limit["value"]["is_null"]:
+                return int(limit["value"]["value"])
+            return None
+    return None
+
+
+def _cardinalities(plan):
+    if isinstance(plan, list):
+        for child in plan:
+            yield from _cardinalities(child)
+        return
+    estimate = plan.get("extra_info", {}).get("Estimated Cardinality")
+    if estimate:
+        digits = re.sub(r"\D", "", str(estimate))
+        if digits:
+            yield int(digits)
+    for child in plan.get("children", []):
+        yield from _cardinalities(child)
@@ -0,0 +1,42 @@
+import fcntl
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+
+@contextmanager
+def writable_path(db_path, swap=False):
+    """Yield a path to write the database at, holding the update lock.
+
+    Updates take an exclusive lock on `<name>.lock`, so concurrent ingest
+    or materialize runs queue up instead of overwriting each other's work.
+
+    By default the file is written directly, so an update costs only the new
+    rows; DuckDB refuses that while a running API holds the file open. With
+    `swap` the database is first copied to a uniquely named temp file next
+    to it, which then replaces the original in one rename; QueryExecutor
+    notices the new file on its next version check and reopens. The copy
+    reads and writes the whole database, so it costs O(total history) per
+    update; use it only when the API must keep serving.
+    """
+    db_path = Path(db_path)
+    lock_path = db_path.with_name(db_path.name + ".lock")
+    with open(lock_path, "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if not swap or not db_path.exists():
+            yield db_path
+            return
+
+        fd, copy_name = tempfile.mkstemp(prefix=db_path.name + ".", suffix=".update", dir=db_path.parent)
+        os.close(fd)
+        copy_path = Path(copy_name)
+        try:
+            shutil.copyfile(db_path, copy_path)
+            yield copy_path
+            os.replace(copy_path, db_path)
+        finally:
+            for path in (copy_path, copy_path.with_name(copy_path.name + ".wal")):
+                if path.exists():
+                    path.unlink()
@@ -0,0 +1,49 @@
+import duckdb
+
+from database.create_reference_tables import PROCESSED_DIR
+from database.ingest import ingest
+
+HOLDINGS_CSV = PROCESSED_DIR / "holdings_clean.csv"
+TRADES_CSV = PROCESSED_DIR / "trades_clean.csv"
+
+
+def _count(db_path, table):
+    conn = duckdb.connect(str(db_path), read_only=True)
+    try:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_reingesting_the_same_files_inserts_nothing(db_path):
+    holdings, trades = _count(db_path, "holdings"), _count(db_path, "trades")
+
+    results = ingest(db_path, [HOLDINGS_CSV], [TRADES_CSV])
+
+    assert [result["rows_inserted"] for result in results] == [0, 0]
+    assert all(result["rows_skipped"] > 0 for result in results)
+    assert (_count(db_path, "holdings"), _count(db_path, "trades")) == (holdings, trades)
+
+
+def test_second_run_of_a_new_file_inserts_nothing(db_path, new_holdings):
+    path = new_holdings("2099-01-01")
+    before = _count(db_path, "holdings")
+
+    first = ingest(db_path, [path])[0]
+    second = ingest(db_path, [path])[0]
+
+    assert first["rows_inserted"] > 0
+    assert first["dates"] == ["2099-01-01"]
+    assert second["rows_inserted"] == 0
+    assert second["rows_skipped"] == first["rows_inserted"]
+    assert _count(db_path, "holdings") == before + first["rows_inserted"]
+
+
+def test_swap_updates_a_copy_and_replaces_the_file(db_path, new_holdings):
+    path = new_holdings("2099-01-01")
+
+    result = ingest(db_path, [path], swap=True)[0]
+
+    assert result["rows_inserted"] > 0
+    assert not list(db_path.parent.glob("*.update*"))
+    assert _count(db_path, "holdings") > result["rows_inserted"]
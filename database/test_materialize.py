@@ -0,0 +1,55 @@
+import duckdb
+import pandas as pd
+
+from database.ingest import ingest
+from database.materialize import MATERIALIZED_VIEWS, summaries_current
+from database.query_executor import QueryExecutor
+
+
+def _assert_summaries_match_views(db_path):
+    conn = duckdb.connect(str(db_path), read_only=True)
+    try:
+        for table, view in MATERIALIZED_VIEWS.items():
+            # Sums are compared approximately: their order differs
+            expected = conn.execute(f"SELECT * FROM {view} ORDER BY ALL").fetchdf()
+            actual = conn.execute(f"SELECT * FROM {table} ORDER BY ALL").fetchdf()
+            pd.testing.assert_frame_equal(actual, expected, check_exact=False, check_dtype=False)
+    finally:
+        conn.close()
+
+
+def _view_map(db_path):
+    executor = QueryExecutor(str(db_path))
+    try:
+        executor.data_version()
+        return executor.view_map
+    finally:
+        executor.close()
+
+
+def test_incremental_refresh_matches_views(db_path, new_holdings):
+    ingest(db_path, [new_holdings("2099-01-01")])
+    # A later snapshot for some funds only
+    ingest(db_path, [new_holdings("2099-02-01", funds=["Ytum", "Garfield"])])
+
+    _assert_summaries_match_views(db_path)
+    assert set(_view_map(db_path).values()) == set(MATERIALIZED_VIEWS)
+
+
+def test_views_are_read_after_ingest_without_refresh(db_path, new_holdings):
+    ingest(db_path, [new_holdings("2099-01-01")], refresh=False)
+
+    conn = duckdb.connect(str(db_path), read_only=True)
+    try:
+        assert not summaries_current(conn)
+    finally:
+        conn.close()
+    assert _view_map(db_path) == {}
+
+
+def test_next_refresh_rebuilds_stale_summaries(db_path, new_holdings):
+    ingest(db_path, [new_holdings("2099-01-01")], refresh=False)
+    ingest(db_path, [new_holdings("2099-02-01", funds=["Ytum"])])
+
+    _assert_summaries_match_views(db_path)
+    assert set(_view_map(db_path).values()) == set(MATERIALIZED_VIEWS)
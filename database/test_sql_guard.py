@@ -0,0 +1,49 @@
+import duckdb
+import pytest
+
+from database.sql_guard import SQLGuard
+
+
+@pytest.fixture
+def guard():
+    return SQLGuard(max_rows=100)
+
+
+def test_wraps_query_without_limit(guard):
+    sql, error = guard.check("SELECT PortfolioName FROM holdings;")
+    assert error is None
+    assert sql == "SELECT * FROM (\nSELECT PortfolioName FROM holdings\n) AS capped LIMIT 100"
+
+
+def test_keeps_a_smaller_limit(guard):
+    sql, error = guard.check("SELECT * FROM trades LIMIT 5 OFFSET 10")
+    assert error is None
+    assert sql == "SELECT * FROM trades LIMIT 5 OFFSET 10"
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT * FROM trades LIMIT 500",
+    "SELECT * FROM trades LIMIT 2 * 3",
+    "SELECT * FROM trades -- no limit",
+])
+def test_wraps_instead_of_rewriting_limit(guard, sql):
+    guarded_sql, error = guard.check(sql)
+    assert error is None
+    assert guarded_sql.startswith(f"SELECT * FROM (\n{sql}\n)")
+    assert guarded_sql.endswith("LIMIT 100")
+
+    # The wrapped query still runs, comment included
+    conn = duckdb.connect()
+    conn.execute("CREATE TABLE trades AS SELECT range AS id FROM range(1000)")
+    assert len(conn.execute(guarded_sql).fetchall()) <= 100
+
+
+@pytest.mark.parametrize("sql, message", [
+    ("DELETE FROM holdings", "Only SELECT allowed"),
+    ("SELECT 1; SELECT 2", "Only a single statement is allowed"),
+    ("SELECT * FROM secrets", "Unknown or restricted tables: secrets"),
+    ("SELECT * FROM read_csv('x.csv')", "Table functions are not allowed: read_csv"),
+    ("SELECT getenv('HOME')", "Functions are not allowed: getenv"),
+])
+def test_rejects(guard, sql, message):
+    assert guard.check(sql) == (None, message)
@@ -1,170 +1,162 @@
+import asyncio
+import logging
 import os
-from huggingface_hub import InferenceClient
+import time
 from dotenv import load_dotenv 
 import os 
 
+from core.metrics import LLM_SECONDS
+from llm.answer_templates import render_answer
+from llm.prompt_compiler import PromptCompiler, TokenUsage
+from llm.transport import DEFAULT_MODEL, LLMTransport
+from llm.result_formatter import format_result_for_prompt
+
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 class AnswerGenerator:
-    def __init__(self, api_key=None, model_name="Qwen/Qwen2.5-7B-Instruct"):
-        self.client = InferenceClient(
-            model=model_name,
-            token=api_key or os.getenv("HF_API_TOKEN")
+    def __init__(self, api_key=None, model_name=DEFAULT_MODEL, compiler=None, cache=None,
+                 transport=None):
+        # The chatbot passes one LLMTransport shared by both generators
+        self.transport = transport or LLMTransport(model_name, token=api_key or os.getenv("HF_API_TOKEN"))
+        self.model_name = self.transport.model_name
+        self.compiler = compiler or PromptCompiler.from_docs()
+        self.usage = TokenUsage()
+        # Optional PersistentLLMCache shared across workers and restarts
+        self.cache = cache
+        self.local_answers = 0
+
+    def generate_answer(self, question, sql_result, usage=None, data_version=None, sql=None):
+        local_answer = self._answer_locally(question, sql_result, sql)
+        if local_answer is not None:
+            return local_answer
+
+        messages = self._build_messages(question, sql_result)
+        cached = self._cached(messages, data_version)
+        if cached is not None:
+            return cached
+        with LLM_SECONDS.time(kind="answer"):
+            response = self.transport.chat_completion(
+                messages=messages,
+                max_tokens=300,
+                temperature=0
+            )
+
+        text = response.choices[0].message.content
+        _update(usage, self.usage.record(response, messages, text))
+        self._store(messages, data_version, text.strip())
+        return text.strip()
+
+    async def generate_answer_async(self, question, sql_result, usage=None, data_version=None, sql=None):
+        local_answer = self._answer_locally(question, sql_result, sql)
+        if local_answer is not None:
+            return local_answer
+
+        messages = self._build_messages(question, sql_result)
+        cached = await asyncio.to_thread(self._cached, messages, data_version)
+        if cached is not None:
+            return cached
+        with LLM_SECONDS.time(kind="answer"):
+            response = await self.transport.chat_completion_async(
+                messages=messages,
+                max_tokens=300,
+                temperature=0
+            )
+
+        text = response.choices[0].message.content
+        _update(usage, self.usage.record(response, messages, text))
+        await asyncio.to_thread(self._store, messages, data_version, text.strip())
+        return text.strip()
+
+    async def stream_answer_async(self, question, sql_result, usage=None, data_version=None, sql=None):
+        """Yield the answer in pieces as the model produces them."""
+        local_answer = self._answer_locally(question, sql_result, sql)
+        if local_answer is not None:
+            yield local_answer
+            return
+
+        messages = self._build_messages(question, sql_result)
+        cached = await asyncio.to_thread(self._cached, messages, data_version)
+        if cached is not None:
+            yield cached
+            return
+        started = time.perf_counter()
+        stream = self.transport.stream_chat_completion(
+            messages=messages,
+            max_tokens=300,
+            temperature=0
         )
 
-    def generate_answer(self, question, sql_result):
+        chunks = []
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                chunks.append(chunk.choices[0].delta.content)
+                yield chunk.choices[0].delta.content
+        # Time to the last token, so the histogram compares with non-streamed calls
+        LLM_SECONDS.observe(time.perf_counter() - started, kind="answer_stream")
+        _update(usage, self.usage.record(None, messages, "".join(chunks)))
+        await asyncio.to_thread(self._store, messages, data_version, "".join(chunks).strip())
+
+    def _cached(self, messages, data_version):
+        if self.cache is None:
+            return None
+        return self.cache.get("answer", self.model_name, messages, data_version)
+
+    def _store(self, messages, data_version, text):
+        if self.cache is not None and text:
+            self.cache.set("answer", self.model_name, messages, data_version, text)
+
+    def _answer_locally(self, question, sql_result, sql=None):
+        """Return an answer without the LLM when possible, else None.
+
+        `sql` is the query that produced the result, if known.
+        """
         if sql_result.get("error"):
             return "Sorry, cannot find the answer in the available data."
 
         data = sql_result.get("data")
-        print(data)
+        logger.debug("Query result: %s", data)
 
         # Simple formatting for single-value results
         if len(data) == 1 and len(data.columns) == 1:
+            self.local_answers += 1
             value = data.iloc[0, 0]
             if isinstance(value, (int, float)):
                 return f"The answer is {value:,.2f}"
             return f"The answer is {value}"
 
-        messages = [
-            {
-                "role": "system",
-                "content": (
-                    """
-You are an expert financial data analyst responsible for converting SQL query results
-from a DuckDB-based analytics system into clear, accurate natural language answers.
-
-The SQL results come ONLY from pre-aggregated views or base tables described below.
-You must understand the MEANING of each column to interpret results correctly.
-
---------------------------------------------------
-AVAILABLE VIEWS (PRIMARY SOURCE OF DATA)
---------------------------------------------------
-
-1. v_fund_summary  
-   • One row per fund (LATEST holdings snapshot only)
-
-   Columns (with meaning):
-   - PortfolioName → Name of the fund / portfolio
-   - num_holdings → Number of distinct securities held by the fund
-   - total_market_value → Total market value (AUM) of the fund
-   - ytd_pl → Year-To-Date profit or loss (annual performance)
-   - mtd_pl → Month-To-Date profit or loss
-   - qtd_pl → Quarter-To-Date profit or loss
-   - as_of_date → Date of the snapshot
-
-   Interpret as:
-   - Fund-level performance and exposure metrics
-
---------------------------------------------------
-
-2. v_trade_summary  
-   • One row per fund (aggregated over ALL trades)
-
-   Columns (with meaning):
-   - PortfolioName → Name of the fund
-   - num_trades → Total number of trades executed
-   - total_cash_flow → Net cash inflow (+) or outflow (-)
-   - avg_trade_size → Average absolute cash value per trade
-   - first_trade_date → Earliest trade date
-   - last_trade_date → Most recent trade date
-
-   Interpret as:
-   - Trading activity and cash movement
-
---------------------------------------------------
-
-3. v_security_summary  
-   • One row per security (LATEST holdings snapshot only)
-
-   Columns (with meaning):
-   - SecurityId → Unique security identifier
-   - SecName → Security name
-   - SecurityTypeName → Type of security (Equity, Bond, etc.)
-   - num_funds_holding → Number of funds holding this security
-   - total_quantity → Total quantity held across all funds
-   - total_market_value → Aggregate market value across all funds
-
-   Interpret as:
-   - Cross-fund exposure and concentration
-
---------------------------------------------------
-
-4. v_data_coverage  
-   • Metadata / diagnostics view
+        # Common result shapes from the summary views
+        if not sql_result.get("truncated"):
+            answer = render_answer(question, data, sql)
+            if answer is not None:
+                self.local_answers += 1
+                return answer
 
-   Columns (with meaning):
-   - table_name → Source table name
-   - start_date → Earliest available date
-   - end_date → Latest available date
-   - num_dates → Number of distinct dates
-   - num_records → Total number of records
+        return None
 
-   Interpret as:
-   - Data availability and coverage diagnostics
-
---------------------------------------------------
-INTERPRETATION RULES (CRITICAL)
---------------------------------------------------
-
-• "performance", "performed better", "outperformed"
-  → Compare profit/loss values
-
-• "yearly", "annual"
-  → Use ytd_pl
-
-• "monthly"
-  → Use mtd_pl
-
-• "quarterly"
-  → Use qtd_pl
-
-• "best", "top", "highest"
-  → Higher profit (larger positive value) means better performance
-
-• "worst", "underperformed"
-  → Lower or more negative profit means worse performance
-
-• If multiple funds are returned:
-  → Rank or compare them based on the relevant profit/loss metric
-
---------------------------------------------------
-RULES (STRICT)
---------------------------------------------------
-
-1. Answer the question using ONLY the data provided.
-2. Do NOT infer, estimate, or use external financial knowledge.
-3. Do NOT invent explanations for missing data.
-4. If the data clearly answers the question:
-   - Summarize it concisely in natural language
-   - Mention fund or security names when present
-   - Explain comparisons when rankings are implied
-   - Format numbers clearly (commas, decimals, currency-neutral)
-5. If the data does NOT answer the question, say EXACTLY:
-   "Sorry, cannot find the answer."
-6. Do NOT mention SQL, tables, views, or internal system details.
-7. Do NOT restate raw tables unless necessary — explain the insight instead.
-
-Your job is to translate structured financial query results
-into accurate, human-readable insights — nothing more.
-
-
-"""
-                )
+    def _build_messages(self, question, sql_result):
+        data = format_result_for_prompt(
+            sql_result["data"],
+            truncated=sql_result.get("truncated", False),
+            total_rows=sql_result.get("row_count"),
+        )
+        return [
+            {
+                "role": "system",
+                "content": self.compiler.answer_system_prompt(list(sql_result["data"].columns))
             },
             {
                 "role": "user",
                 "content": (
                     f"Question:\n{question}\n\n"
-                    f"Data:\n{data.to_string()}"
+                    f"Data:\n{data}"
                 )
             }
         ]
 
-        response = self.client.chat_completion(
-            messages=messages,
-            max_tokens=300,
-            temperature=0
-        )
 
-        return response.choices[0].message.content.strip()
+def _update(usage, values):
+    # Callers pass a dict to receive this call's token counts
+    if usage is not None:
+        usage.update(values)
@@ -0,0 +1,122 @@
+import math
+import re
+
+import pandas as pd
+
+NAME_COLUMNS = ["PortfolioName", "SecName", "Name", "SecurityId", "table_name"]
+
+# Known result columns -> (label, kind); kind is "amount", "count" or "text"
+COLUMN_LABELS = {
+    "ytd_pl": ("year-to-date P&L", "amount"),
+    "mtd_pl": ("month-to-date P&L", "amount"),
+    "qtd_pl": ("quarter-to-date P&L", "amount"),
+    "total_market_value": ("total market value", "amount"),
+    "num_holdings": ("number of holdings", "count"),
+    "num_trades": ("number of trades", "count"),
+    "total_cash_flow": ("net cash flow", "amount"),
+    "avg_trade_size": ("average trade size", "amount"),
+    "num_funds_holding": ("number of funds holding it", "count"),
+    "total_quantity": ("total quantity", "amount"),
+    "first_trade_date": ("first trade date", "text"),
+    "last_trade_date": ("last trade date", "text"),
+    "as_of_date": ("as of date", "text"),
+    "SecurityTypeName": ("security type", "text"),
+    "SecurityId": ("security ID", "text"),
+}
+
+# A query returning the single top or bottom row: ORDER BY <column> [DESC] ... LIMIT 1
+RANKING_SQL = re.compile(
+    r"\border\s+by\s+(?:\w+\.)?\"?(\w+)\"?(?:\s+(asc|desc))?(?:\s+nulls\s+(?:first|last))?"
+    r"\s+limit\s+1\s*;?\s*$",
+    re.IGNORECASE
+)
+
+MAX_LIST_ROWS = 10
+
+
+def render_answer(question, data, sql=None):
+    """Write the answer for common result shapes, or return None.
+
+    Handles coverage rows, a single entity with known metrics, and short
+    ranked lists of entities with one known metric. Anything with columns
+    outside COLUMN_LABELS is left to the LLM. A single row is only called
+    the highest or lowest when `sql` ranked by its metric.
+    """
+    if data is None or data.empty:
+        return None
+
+    columns = list(data.columns)
+
+    if {"table_name", "start_date", "end_date"} <= set(columns):
+        return _render_coverage(data)
+
+    # The entity is named by the most descriptive name column present
+    name_column = next((column for column in NAME_COLUMNS if column in columns), None)
+    metrics = [column for column in columns if column != name_column]
+    if name_column is None or not metrics or any(column not in COLUMN_LABELS for column in metrics):
+        return None
+
+    # 1. One entity
+    if len(data) == 1:
+        row = data.iloc[0]
+        entity = row[name_column]
+        direction = _ranking(sql, metrics[0]) if len(metrics) == 1 else None
+        if direction:
+            label = COLUMN_LABELS[metrics[0]][0]
+            return f"{entity} has the {direction} {label}, at {_format(row[metrics[0]], metrics[0])}."
+        details = ", ".join(
+            f"{COLUMN_LABELS[column][0]} {_format(row[column], column)}" for column in metrics
+        )
+        return f"{entity}: {details}."
+
+    # 2. A short list ranked by one metric
+    if len(metrics) == 1 and len(data) <= MAX_LIST_ROWS:
+        column = metrics[0]
+        label = COLUMN_LABELS[column][0]
+        lines = [
+            f"{position}. {row[name_column]}: {_format(row[column], column)}"
+            for position, (_, row) in enumerate(data.iterrows(), start=1)
+        ]
+        return f"{label[0].upper()}{label[1:]} ({len(data)} results):\n" + "\n".join(lines)
+
+    return None
+
+
+def _ranking(sql, column):
+    """"highest" or "lowest" if `sql` keeps the one row ranked by `column`."""
+    match = RANKING_SQL.search(sql or "")
+    if match is None or match.group(1).lower() != column.lower():
+        return None
+    return "highest" if (match.group(2) or "").lower() == "desc" else "lowest"
+
+
+def _render_coverage(data):
+    lines = []
+    for _, row in data.iterrows():
+        line = f"{row['table_name']}: data from {row['start_date']} to {row['end_date']}"
+        extras = []
+        if "num_dates" in data.columns:
+            extras.append(_plural(int(row['num_dates']), "date"))
+        if "num_records" in data.columns:
+            extras.append(_plural(int(row['num_records']), "record"))
+        if extras:
+            line += f" ({', '.join(extras)})"
+        lines.append(line)
+    return "Data coverage:\n" + "\n".join(lines)
+
+
+def _format(value, column):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return "not available"
+    if isinstance(value, pd.Timestamp):
+        return value.strftime("%Y-%m-%d")
+    kind = COLUMN_LABELS.get(column, ("", "text"))[1]
+    if kind == "count":
+        return f"{int(value):,}"
+    if kind == "amount":
+        return f"{float(value):,.2f}"
+    return str(value)
+
+
+def _plural(count, noun):
+    return f"{count:,} {noun}{'' if count == 1 else 's'}"
@@ -0,0 +1,375 @@
+import re
+import threading
+
+from core.semantic_cache import STOPWORDS, normalize_question
+from database.schema_docs import TABLE_DOCS, COLUMN_DOCS
+
+# Words that favour a view without naming any of its columns
+TABLE_HINTS = {
+    "v_fund_summary": {"best", "worst", "performance", "aum"},
+    "v_trade_summary": {"activity", "frequency"},
+    "v_security_summary": {"exposure", "concentration"},
+    "v_data_coverage": {"coverage", "available", "data"},
+}
+
+# Words in a question that ask for a column, beyond the column's own name.
+# Column names are matched only when every specific word in them is used
+# ("trade type" is TradeTypeName, "type" alone is nothing).
+COLUMN_HINTS = {
+    "v_fund_summary": {
+        "PortfolioName": {"fund"},
+        "total_market_value": {"mv"},
+        "ytd_pl": {"loss"},
+        "mtd_pl": {"loss"},
+        "qtd_pl": {"loss"},
+    },
+    "v_trade_summary": {
+        "PortfolioName": {"fund"},
+        "num_trades": {"trade", "traded", "trading", "activity"},
+        "total_cash_flow": {"cash"},
+        "avg_trade_size": {"average", "size"},
+        "first_trade_date": {"first", "earliest"},
+        "last_trade_date": {"last", "latest", "recent"},
+    },
+    "v_security_summary": {
+        "SecName": {"security", "stock"},
+        "SecurityTypeName": {"equity", "bond"},
+        "num_funds_holding": {"fund", "held", "hold"},
+        "total_market_value": {"mv"},
+    },
+    "v_data_coverage": {
+        "table_name": {"table"},
+        "start_date": {"range", "cover", "earliest", "available"},
+        "end_date": {"range", "cover", "latest", "available"},
+        "num_records": {"row"},
+    },
+    "holdings": {
+        "PortfolioName": {"fund"},
+        "SecName": {"security", "stock", "holding", "position"},
+        "SecurityTypeName": {"equity", "bond"},
+        "DirectionName": {"long", "short"},
+        "StrategyRefShortName": {"strategy"},
+        "Qty": {"quantity", "held", "hold", "much", "position"},
+        "MV_Base": {"mv", "position"},
+        "AsOfDate": {"snapshot"},
+        "PL_YTD": {"loss"},
+        "PL_MTD": {"loss"},
+        "PL_QTD": {"loss"},
+    },
+    "trades": {
+        "PortfolioName": {"fund"},
+        "TradeDate": {"trade", "traded", "trading"},
+        "TradeTypeName": {"buy", "sell", "bought", "sold", "sale", "short"},
+        "Name": {"security", "stock"},
+        "Quantity": {"quantity", "much"},
+        "TotalCash": {"cash"},
+        "SettleDate": {"settle", "settlement"},
+    },
+}
+
+# Parts of column names too general to ask for a column on their own
+GENERIC_WORDS = {"id", "name", "num", "total", "avg", "as", "of", "base", "table"}
+
+BASE_TABLES = {"holdings", "trades"}
+
+INTERPRETATION_RULES = """\
+INTERPRETATION RULES
+- "performance", "performed better", "best fund" -> profit/loss metrics (prefer ytd_pl)
+- "yearly", "annual" -> ytd_pl; "monthly" -> mtd_pl; "quarterly" -> qtd_pl
+- "better", "top", "best", "highest" -> larger value is better
+- "worst", "underperformed", "lowest" -> smaller (more negative) value is worse"""
+
+SQL_RULES = """\
+GLOBAL RULES (STRICT)
+1. ALWAYS try to answer using a VIEW first; use base tables ONLY if no view has the metric.
+2. Fund names are case-insensitive: use LOWER(PortfolioName) = '<lowercase name>'.
+3. Do NOT invent columns or metrics.
+4. If the question cannot be answered with the available data, return:
+   {"sql": null, "error": "Cannot answer"}
+5. Output ONLY valid JSON: {"sql": "<SQL_QUERY>", "error": null}"""
+
+SQL_EXAMPLES = {
+    "v_fund_summary": [
+        ("Total holdings for Fund ABC",
+         "SELECT num_holdings FROM v_fund_summary WHERE LOWER(PortfolioName) = 'abc';"),
+        ("Best performing fund by yearly profit",
+         "SELECT PortfolioName, ytd_pl FROM v_fund_summary ORDER BY ytd_pl DESC LIMIT 1;"),
+        ("Funds with negative yearly performance",
+         "SELECT PortfolioName, ytd_pl FROM v_fund_summary WHERE ytd_pl < 0;"),
+    ],
+    "v_security_summary": [
+        ("Which security is held by the most funds?",
+         "SELECT SecName, num_funds_holding FROM v_security_summary ORDER BY num_funds_holding DESC LIMIT 1;"),
+    ],
+}
+
+ANSWER_RULES = """\
+RULES (STRICT)
+1. Answer the question using ONLY the data provided.
+2. Do NOT infer, estimate, or use external financial knowledge.
+3. Do NOT invent explanations for missing data.
+4. If the data answers the question, summarize it concisely: mention fund or
+   security names, explain comparisons when rankings are implied, and format
+   numbers clearly (commas, decimals, currency-neutral).
+5. If the data does NOT answer the question, say EXACTLY:
+   "Sorry, cannot find the answer."
+6. Do NOT mention SQL, tables, views, or internal system details.
+7. Do NOT restate raw tables unless necessary; explain the insight instead."""
+
+
+def estimate_tokens(text):
+    # ~4 characters per token for English/SQL text
+    return max(1, len(text) // 4)
+
+
+class TokenUsage:
+    """Running prompt/completion token totals for one generator."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def record(self, response, messages, completion_text):
+        """Add one call's usage (from the response, else estimated) and return it."""
+        usage = getattr(response, "usage", None)
+        prompt_tokens = getattr(usage, "prompt_tokens", None)
+        if prompt_tokens is None:
+            prompt_tokens = sum(estimate_tokens(message["content"]) for message in messages)
+        completion_tokens = getattr(usage, "completion_tokens", None)
+        if completion_tokens is None:
+            completion_tokens = estimate_tokens(completion_text or "")
+
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens}
+
+    def stats(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+            }
+
+
+class PromptCompiler:
+    """Builds the SQL and answer system prompts from the database catalog.
+
+    Only the tables relevant to a question are described, base tables lose
+    the columns nobody asked about, and the schema section is kept under
+    `token_budget` (estimated) tokens.
+    """
+
+    def __init__(self, catalog, token_budget=900):
+        # catalog: {table: {"comment": str, "columns": [(name, type, comment)]}}
+        self.catalog = catalog
+        self.token_budget = token_budget
+        self._terms = {table: self._column_terms(table, info) for table, info in catalog.items()}
+        self._column_docs = {}
+        for info in catalog.values():
+            for name, _, comment in info["columns"]:
+                if comment and name not in self._column_docs:
+                    self._column_docs[name] = comment
+
+    @classmethod
+    def from_connection(cls, conn, **kwargs):
+        """Read tables, columns and their comments from the DuckDB catalog."""
+        tables = {
+            name: comment
+            for name, comment in conn.execute("""
+                SELECT table_name, comment FROM duckdb_tables() WHERE NOT internal AND NOT temporary
+                UNION ALL
+                SELECT view_name, comment FROM duckdb_views() WHERE NOT internal AND NOT temporary
+            """).fetchall()
+            if name in TABLE_DOCS
+        }
+        catalog = {name: {"comment": comment or TABLE_DOCS[name], "columns": []} for name, comment in tables.items()}
+        for table, column, data_type, comment in conn.execute("""
+            SELECT table_name, column_name, data_type, comment
+            FROM duckdb_columns()
+            WHERE NOT internal
+            ORDER BY table_name, column_index
+        """).fetchall():
+            if table in catalog:
+                comment = comment or COLUMN_DOCS.get(table, {}).get(column)
+                catalog[table]["columns"].append((column, data_type, comment))
+        return cls(catalog, **kwargs)
+
+    @classmethod
+    def from_docs(cls, **kwargs):
+        """Catalog built from schema_docs alone, for use without a database."""
+        catalog = {
+            table: {
+                "comment": TABLE_DOCS[table],
+                "columns": [(column, "", comment) for column, comment in columns.items()],
+            }
+            for table, columns in COLUMN_DOCS.items()
+        }
+        return cls(catalog, **kwargs)
+
+    def select_tables(self, question, entities=None):
+        return self._select(question, entities)[0]
+
+    def _select(self, question, entities=None):
+        """(tables, {table: {data term: columns answering it}}) for a question.
+
+        The view answering the most data terms comes first. A term it does
+        not answer brings in the table, view or else base table, that
+        answers it; and when no chosen table answers every term, the base
+        table answering the most is added too, as a filter and the metric
+        it filters have to come from one table.
+        """
+        answers = self._answers(question, entities)
+        terms = set().union(*answers.values())
+
+        # 1. The view answering the most terms, counting its table hints
+        tokens = _question_tokens(question)
+        scores = {
+            table: len(answers[table]) + len(tokens & TABLE_HINTS.get(table, set()))
+            for table in self.catalog if table not in BASE_TABLES
+        }
+        top = max(scores, key=lambda table: scores[table], default=None)
+        selected = [top] if top and scores[top] else []
+
+        # 2. Tables for the terms no chosen table has a column for
+        remaining = terms - set().union(*(answers[table] for table in selected))
+        while remaining:
+            table = max(
+                (table for table in self.catalog if table not in selected),
+                key=lambda table: (len(remaining & answers[table].keys()), table not in BASE_TABLES,
+                                   len(answers[table])),
+                default=None
+            )
+            if table is None or not remaining & answers[table].keys():
+                break
+            selected.append(table)
+            remaining -= answers[table].keys()
+
+        # 3. One table answering everything
+        best = max((len(answers[table]) for table in selected), default=0)
+        if best < len(terms):
+            bases = [table for table in self.catalog if table in BASE_TABLES and table not in selected]
+            base = max(bases, key=lambda table: len(answers[table]), default=None)
+            if base and len(answers[base]) > best:
+                selected.append(base)
+
+        selected = [table for table in selected if table not in BASE_TABLES] + \
+            [table for table in selected if table in BASE_TABLES]
+        if not selected:
+            selected = [table for table in ("v_fund_summary",) if table in self.catalog] or list(self.catalog)[:1]
+        return selected, answers
+
+    def schema_section(self, question, entities=None):
+        tables, answers = self._select(question, entities)
+        tokens = _question_tokens(question)
+        sections = []
+        used = 0
+        for table in tables:
+            asked = {column for columns in answers[table].values() for column in columns}
+            section = self._describe_table(table, tokens, asked)
+            cost = estimate_tokens(section)
+            if sections and used + cost > self.token_budget:
+                break
+            sections.append(section)
+            used += cost
+        return "\n\n".join(sections)
+
+    def sql_system_prompt(self, question, entities=None):
+        tables = self.select_tables(question, entities)
+        examples = [example for table in tables for example in SQL_EXAMPLES.get(table, [])]
+        parts = [
+            "You are an expert SQL generator for a DuckDB-based financial analytics system.\n"
+            "Generate one correct, efficient SQL query for the user's question.",
+            "AVAILABLE TABLES AND VIEWS\n" + self.schema_section(question, entities),
+            INTERPRETATION_RULES,
+            SQL_RULES,
+        ]
+        if examples:
+            parts.append("EXAMPLES\n" + "\n".join(f'Q: "{q}"\nA: {sql}' for q, sql in examples))
+        return "\n\n".join(parts)
+
+    def answer_system_prompt(self, columns):
+        described = [f"- {column} -> {self._column_docs[column]}" for column in columns if column in self._column_docs]
+        parts = [
+            "You are an expert financial data analyst. Convert the query result below into a clear, "
+            "accurate natural language answer."
+        ]
+        if described:
+            parts.append("RESULT COLUMNS\n" + "\n".join(described))
+        parts += [INTERPRETATION_RULES, ANSWER_RULES]
+        return "\n\n".join(parts)
+
+    def _describe_table(self, table, tokens, asked=()):
+        info = self.catalog[table]
+        columns = info["columns"]
+        if table in BASE_TABLES:
+            # Documented columns plus any column the question asks for
+            columns = [
+                column for column in columns
+                if column[2] or column[0] in asked or column[0].lower() in tokens
+            ]
+        lines = [f"{table}: {info['comment']}"]
+        for name, data_type, comment in columns:
+            detail = f" -> {comment}" if comment else ""
+            type_note = f" ({data_type})" if data_type and table in BASE_TABLES else ""
+            lines.append(f"  - {name}{type_note}{detail}")
+        return "\n".join(lines)
+
+    def _column_terms(self, table, info):
+        """(column, words) pairs; a question asks for the column when it uses all the words.
+
+        Only documented or hinted columns count, so the many raw columns of
+        the base tables do not claim words like "short" or "cash".
+        """
+        hints = COLUMN_HINTS.get(table, {})
+        terms = []
+        for name, _, comment in info["columns"]:
+            if comment:
+                words = {_stem(word) for word in _split_identifier(name) - {name.lower()}}
+                words -= STOPWORDS | GENERIC_WORDS
+                terms.append((name, frozenset(words or {name.lower()})))
+            for word in hints.get(name, ()):
+                terms.append((name, frozenset({_stem(word)})))
+        return terms
+
+    def _answers(self, question, entities=None):
+        """{table: {data term: columns}} for the words and names in a question."""
+        entities = entities or []
+        named = {_stem(word) for match in entities for word in re.findall(r"[a-z0-9]+", match["value"].lower())}
+        tokens = _question_tokens(question) - named
+        answers = {}
+        for table, info in self.catalog.items():
+            found = answers[table] = {}
+            for column, words in self._terms[table]:
+                if words <= tokens:
+                    for word in words:
+                        found.setdefault(word, set()).add(column)
+            # A name is answered by the tables with a column holding it
+            names = {name for name, _, _ in info["columns"]}
+            for match in entities:
+                for column in set(match["columns"]) & names:
+                    found.setdefault(f"={match['mention']}", set()).add(column)
+        return answers
+
+
+def _question_tokens(question):
+    raw = set(re.findall(r"[a-z0-9_]+", question.lower())) - STOPWORDS
+    return {_stem(token) for token in raw | set(normalize_question(question).split())}
+
+
+def _stem(word):
+    """Singular form, enough to match "counterparties" to Counterparty."""
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    if word.endswith("s") and not word.endswith("ss") and len(word) > 3:
+        return word[:-1]
+    return word
+
+
+def _split_identifier(name):
+    spaced = re.sub(r"([a-z])([A-Z])", r"\1 \2", name).replace("_", " ").lower()
+    return set(spaced.split()) | {name.lower()}
@@ -0,0 +1,40 @@
+import pandas as pd
+
+
+def format_result_for_prompt(data, truncated=False, total_rows=None, max_rows=20, max_chars=4000):
+    """Render a query result for the answer prompt within a fixed budget.
+
+    Small results are passed through as a table. Larger ones become the
+    first `max_rows` rows (the query's own ordering, so top-N), summary
+    statistics for the numeric columns over all fetched rows, and a note
+    saying how much was left out.
+    """
+    total_rows = total_rows if total_rows is not None else len(data)
+    # Only the rows that can be shown are rendered
+    shown = data.head(max_rows)
+    table = shown.to_string(max_colwidth=60)
+    if len(data) <= max_rows and len(table) <= max_chars and not truncated:
+        return table
+
+    parts = [table]
+
+    numeric = data.select_dtypes("number")
+    if not numeric.empty:
+        stats = pd.DataFrame({
+            "count": numeric.count(),
+            "sum": numeric.sum(),
+            "min": numeric.min(),
+            "max": numeric.max(),
+            "mean": numeric.mean(),
+        })
+        parts.append(f"Summary of numeric columns over {len(data):,} rows:\n{stats.to_string()}")
+
+    note = f"Note: showing {len(shown):,} of {total_rows:,}{'+' if truncated else ''} rows."
+    if truncated:
+        note += " The result was cut off at the row limit, so totals cover only the rows fetched."
+    parts.append(note)
+
+    text = "\n\n".join(parts)
+    if len(text) > max_chars:
+        text = text[:max_chars - len(note) - 5] + "\n...\n" + note
+    return text
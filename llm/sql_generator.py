@@ -1,211 +1,96 @@
+import asyncio
 import os
 import json
-from huggingface_hub import InferenceClient
+import logging
 from dotenv import load_dotenv 
 import re
 
+from core.metrics import LLM_SECONDS
+from llm.prompt_compiler import PromptCompiler, TokenUsage
+from llm.transport import DEFAULT_MODEL, LLMTransport
+
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 class SQLGenerator:
-    def __init__(self, api_key=None, model_name="Qwen/Qwen2.5-7B-Instruct"):
-        self.client = InferenceClient(
-            model=model_name,
-            token=api_key or os.getenv("HF_API_TOKEN")
-        )
-
-    def generate_sql(self, question):
-        system_prompt = """You are an expert SQL generator for a DuckDB-based financial analytics system.
-Your task is to generate correct, efficient SQL queries based on user questions.
-
-You must understand both:
-• the STRUCTURE of the data (tables, views, columns)
-• the MEANING of each column (financial semantics)
-
---------------------------------------------------
-AVAILABLE VIEWS (ALWAYS USE THESE FIRST — THEY ARE FAST AND PRE-AGGREGATED)
---------------------------------------------------
-
-1. v_fund_summary  
-   • One row per fund (LATEST holdings snapshot only)  
-
-   Columns (with meaning):
-   - PortfolioName → Name of the fund / portfolio
-   - num_holdings → Number of distinct securities held by the fund
-   - total_market_value → Total market value (AUM) of the fund
-   - ytd_pl → Year-To-Date Profit and Loss of the fund
-   - mtd_pl → Month-To-Date Profit and Loss of the fund
-   - qtd_pl → Quarter-To-Date Profit and Loss of the fund
-   - as_of_date → Date of the holdings snapshot
-
-   Use this view for:
-   - Fund performance analysis
-   - Comparing funds
-   - Best / worst performing funds
-   - Holdings count per fund
-   - AUM / exposure questions
-
---------------------------------------------------
-
-2. v_trade_summary  
-   • One row per fund (aggregated over ALL trades)
-
-   Columns (with meaning):
-   - PortfolioName → Name of the fund
-   - num_trades → Total number of trades executed
-   - total_cash_flow → Net cash inflow / outflow from trades
-   - avg_trade_size → Average absolute cash value per trade
-   - first_trade_date → Date of earliest trade
-   - last_trade_date → Date of most recent trade
-
-   Use this view for:
-   - Trading activity
-   - Cash flow analysis
-   - Trade frequency questions
-
---------------------------------------------------
-
-3. v_security_summary  
-   • One row per security (LATEST holdings snapshot only)
-
-   Columns (with meaning):
-   - SecurityId → Unique security identifier
-   - SecName → Security name
-   - SecurityTypeName → Type of security (Equity, Bond, etc.)
-   - num_funds_holding → Number of funds holding this security
-   - total_quantity → Total quantity held across all funds
-   - total_market_value → Total market value across all funds
-
-   Use this view for:
-   - Top securities
-   - Cross-fund exposure
-   - Concentration analysis
-
---------------------------------------------------
-
-4. v_data_coverage  
-   • Metadata / diagnostics view
-
-   Columns (with meaning):
-   - table_name → Source table name
-   - start_date → Earliest available date
-   - end_date → Latest available date
-   - num_dates → Number of distinct dates available
-   - num_records → Total number of records
-
-   Use this view for:
-   - Data availability questions
-   - Coverage diagnostics
-   - Debugging missing data
-
---------------------------------------------------
-BASE TABLES (USE ONLY IF A VIEW CANNOT ANSWER THE QUESTION)
---------------------------------------------------
-
-- holdings  
-  Columns:
-  - PortfolioName → Fund name
-  - AsOfDate → Holdings date
-  - Qty → Quantity held
-  - MV_Base → Market value
-  - PL_YTD → Year-to-date profit/loss
-  - PL_MTD → Month-to-date profit/loss
-  - PL_QTD → Quarter-to-date profit/loss
-  - SecurityId → Security identifier
-  - SecName → Security name
-  - SecurityTypeName → Security type
-
-- trades  
-  Columns:
-  - PortfolioName → Fund name
-  - TradeDate → Trade execution date
-  - Quantity → Quantity traded
-  - TotalCash → Cash value of trade
-  - SecurityId → Security identifier
-  - Name → Security name
-
---------------------------------------------------
-INTERPRETATION RULES (VERY IMPORTANT)
---------------------------------------------------
-
-• "performance", "performed better", "best fund"
-  → Use profit/loss metrics (prefer ytd_pl)
-
-• "yearly", "annual"
-  → Year-To-Date (ytd_pl)
-
-• "monthly"
-  → Month-To-Date (mtd_pl)
-
-• "quarterly"
-  → Quarter-To-Date (qtd_pl)
-
-• "better", "top", "best"
-  → ORDER BY metric DESC
-
-• "worst", "underperformed"
-  → ORDER BY metric ASC
-
---------------------------------------------------
-GLOBAL RULES (STRICT)
---------------------------------------------------
-
-1. ALWAYS try to answer using a VIEW first.
-2. Use base tables ONLY if the required metric does not exist in any view.
-3. Fund names are case-insensitive:
-   - Use LOWER(PortfolioName)
-4. Do NOT invent columns or metrics.
-5. If the question cannot be answered with available data, return:
-   {"sql": null, "error": "Cannot answer"}
-6. Output ONLY valid JSON:
-   {"sql": "<SQL_QUERY>", "error": null}
-
---------------------------------------------------
-EXAMPLES
---------------------------------------------------
-
-Q: "Total holdings for Fund ABC"
-A:
-SELECT num_holdings
-FROM v_fund_summary
-WHERE LOWER(PortfolioName) = 'abc';
-
-Q: "Best performing fund by yearly profit"
-A:
-SELECT PortfolioName, ytd_pl
-FROM v_fund_summary
-ORDER BY ytd_pl DESC
-LIMIT 1;
-
-Q: "Funds with negative yearly performance"
-A:
-SELECT PortfolioName, ytd_pl
-FROM v_fund_summary
-WHERE ytd_pl < 0;
-
-Q: "Which security is held by the most funds?"
-A:
-SELECT SecName, num_funds_holding
-FROM v_security_summary
-ORDER BY num_funds_holding DESC
-LIMIT 1;
-
-"""
-
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": f"Generate SQL for: {question}"}
+    def __init__(self, api_key=None, model_name=DEFAULT_MODEL, compiler=None, cache=None,
+                 transport=None):
+        # The chatbot passes one LLMTransport shared by both generators
+        self.transport = transport or LLMTransport(model_name, token=api_key or os.getenv("HF_API_TOKEN"))
+        self.model_name = self.transport.model_name
+        self.compiler = compiler or PromptCompiler.from_docs()
+        self.usage = TokenUsage()
+        # Optional PersistentLLMCache shared across workers and restarts
+        self.cache = cache
+
+    def _build_messages(self, question, entities=None, context=None):
+        content = f"Generate SQL for: {question}"
+        if entities:
+            content += "\n\n" + _entity_hints(entities)
+        if context:
+            content = f"{context}\n\n{content}"
+        return [
+            {"role": "system", "content": self.compiler.sql_system_prompt(question, entities)},
+            {"role": "user", "content": content}
         ]
 
-        response = self.client.chat_completion(
-            messages=messages,
-            max_tokens=512,
-            temperature=0
-        )
-
-        print(response)
-
-        text = response.choices[0].message.content.strip()
+    def generate_sql(self, question, data_version=None, entities=None, context=None):
+        """`entities` are EntityIndex matches for names in the question;
+        `context` is a session's summary of the conversation so far."""
+        messages = self._build_messages(question, entities, context)
+        cached = self._cached(messages, data_version)
+        if cached is not None:
+            return cached
+        with LLM_SECONDS.time(kind="sql"):
+            response = self.transport.chat_completion(
+                messages=messages,
+                max_tokens=512,
+                temperature=0
+            )
+
+        logger.debug("SQL response: %s", response)
+
+        text = response.choices[0].message.content
+        sql_result = self._parse_response(text)
+        self._store(messages, data_version, sql_result)
+        sql_result["usage"] = self.usage.record(response, messages, text)
+        return sql_result
+
+    async def generate_sql_async(self, question, data_version=None, entities=None, context=None):
+        messages = self._build_messages(question, entities, context)
+        cached = await asyncio.to_thread(self._cached, messages, data_version)
+        if cached is not None:
+            return cached
+        with LLM_SECONDS.time(kind="sql"):
+            response = await self.transport.chat_completion_async(
+                messages=messages,
+                max_tokens=512,
+                temperature=0
+            )
+
+        text = response.choices[0].message.content
+        sql_result = self._parse_response(text)
+        await asyncio.to_thread(self._store, messages, data_version, sql_result)
+        sql_result["usage"] = self.usage.record(response, messages, text)
+        return sql_result
+
+    def _cached(self, messages, data_version):
+        if self.cache is None:
+            return None
+        sql_result = self.cache.get("sql", self.model_name, messages, data_version)
+        if sql_result is not None:
+            sql_result.update(usage=None, cached=True)
+        return sql_result
+
+    def _store(self, messages, data_version, sql_result):
+        if self.cache is not None:
+            self.cache.set("sql", self.model_name, messages, data_version,
+                           {"sql": sql_result.get("sql"), "error": sql_result.get("error")})
+
+    def _parse_response(self, text):
+        text = text.strip()
 
       # 1️⃣ Try fenced ```json``` block
         fenced_match = re.search(r"```json\s*(\{.*?\})\s*```", text, re.DOTALL)
@@ -215,8 +100,18 @@ LIMIT 1;
         # 2️⃣ Try any JSON object in text
         raw_json_match = re.search(r"(\{[\s\S]*\})", text)
         if raw_json_match:
-            print(json.loads(raw_json_match.group(1)))
             return json.loads(raw_json_match.group(1))
 
         # 3️⃣ Nothing worked
         raise ValueError("No valid JSON found in LLM response")
+
+
+def _entity_hints(entities):
+    lines = []
+    for match in entities:
+        value = match["value"].replace("'", "''")
+        line = f"- {' / '.join(match['columns'])} = '{value}'"
+        if match["mention"] != match["value"]:
+            line += f' (written "{match["mention"]}")'
+        lines.append(line)
+    return "Names in the question, as stored in the database:\n" + "\n".join(dict.fromkeys(lines))
@@ -0,0 +1,290 @@
+import re
+import threading
+
+from core.semantic_cache import normalize_question
+
+# Normalized metric token -> (view, column), following the interpretation
+# rules in SQLGenerator's system prompt
+FUND_METRICS = {
+    "ytd": ("v_fund_summary", "ytd_pl"),
+    "mtd": ("v_fund_summary", "mtd_pl"),
+    "qtd": ("v_fund_summary", "qtd_pl"),
+    "mv": ("v_fund_summary", "total_market_value"),
+    "holdings": ("v_fund_summary", "num_holdings"),
+    "trades": ("v_trade_summary", "num_trades"),
+    "cash": ("v_trade_summary", "total_cash_flow"),
+    "trade size": ("v_trade_summary", "avg_trade_size"),
+}
+
+COVERAGE_PATTERN = re.compile(
+    r"\b(coverage|date range|dates available|data available|available data|"
+    r"how many records|latest date|earliest date|start date|end date)\b"
+)
+# "Held" is required: "best" or "most" alone is a ranking by some metric
+MOST_HELD_PATTERN = re.compile(
+    r"\bsecurity\b.*\b(held|hold|holds|holding)\b.*\bmost\b.*\bfund\b|"
+    r"\bsecurity\b.*\bmost\b.*\bfund\b.*\b(held|hold|holding)\b|\bmost widely held\b"
+)
+TOP_N_PATTERN = re.compile(r"\bbest (\d+)\b|\bworst (\d+)\b|\b(\d+) (best|worst)\b")
+
+# Fund questions are only routed when every remaining word is one of these;
+# anything else (a security type, a date, a filter) goes to the LLM
+FUND_VOCABULARY = {
+    "fund", "best", "worst", "most", "least", "fewest", "ytd", "mtd", "qtd", "pl",
+    "mv", "holdings", "holding", "positions", "number", "count", "how", "many",
+    "much", "total", "trades", "trade", "cash", "flow", "size", "average", "avg",
+    "negative", "positive", "losing", "loss", "losses", "profitable", "value",
+    "current", "currently", "latest", "now", "made", "make", "earned", "one",
+}
+
+# Words a data coverage question may use besides the COVERAGE_PATTERN phrase
+COVERAGE_VOCABULARY = {
+    "date", "dates", "range", "data", "cover", "covers", "coverage", "available", "availability",
+    "how", "many", "records", "latest", "earliest", "start", "end", "first", "last", "there",
+    "we", "our", "database", "table", "tables", "from", "far", "back", "go", "loaded", "all",
+}
+
+# Words a most-held security question may use
+MOST_HELD_VOCABULARY = {
+    "security", "most", "widely", "held", "hold", "holds", "holding", "fund", "across",
+    "number", "many", "how", "one", "currently", "all", "best",
+}
+
+# A question that refers back to the previous answer
+FOLLOW_UP_PATTERN = re.compile(
+    r"^\s*(and|now|only|just|what about|how about|sort|order|rank|filter|exclude|same)\b|"
+    r"\b(those|these|them|the ones|that list|the same|previous|above)\b"
+)
+
+# Extra words a filter / sort follow-up may use
+FOLLOW_UP_VOCABULARY = FUND_VOCABULARY | {
+    "now", "only", "just", "those", "these", "them", "ones", "sort", "sorted", "order",
+    "rank", "ranked", "filter", "keep", "descending", "ascending", "instead", "again",
+    "then", "about", "same", "previous", "above", "first",
+}
+
+
+class SQLRouter:
+    """Rule-based fast path that turns common question templates into SQL.
+
+    `route()` returns the same {"sql", "error"} shape as
+    SQLGenerator.generate_sql, or None when no template matches and the LLM
+    has to be asked.
+    """
+
+    def __init__(self, fund_names=()):
+        self.fund_names = []
+        self.data_version = None
+        self.lookups = 0
+        self.matches = 0
+        self.intent_counts = {}
+        self._lock = threading.Lock()
+        self.update_funds(fund_names)
+
+    def update_funds(self, fund_names, data_version=None):
+        # Longest names first so "CoYold 11" wins over "CoYold 1"
+        self.fund_names = sorted(set(fund_names), key=len, reverse=True)
+        self.data_version = data_version
+
+    def route(self, question):
+        normalized = normalize_question(question)
+        intent, sql = self._match(question.lower(), normalized)
+        with self._lock:
+            self.lookups += 1
+            if sql is not None:
+                self.matches += 1
+                self.intent_counts[intent] = self.intent_counts.get(intent, 0) + 1
+        if sql is None:
+            return None
+        return {"sql": sql, "error": None, "intent": intent}
+
+    def is_follow_up(self, question):
+        return bool(FOLLOW_UP_PATTERN.search(question.lower()))
+
+    def route_follow_up(self, question, columns, relation="last_result", funds=None):
+        """Filter or re-rank the previous result, e.g. "now only the ones
+        with negative YTD" or "sort those by AUM".
+
+        `columns` are the previous result's columns and `funds` the fund
+        names in it. A fund metric it lacks is joined in from its view by
+        PortfolioName, keeping rows the view has no match for. Returns None
+        when the follow-up needs the LLM, including "what about <fund>" for
+        a fund the previous result does not have.
+        """
+        normalized = normalize_question(question)
+        fund = self._find_fund(question.lower())
+        remaining = normalized
+        if fund is not None:
+            remaining = f" {normalized} ".replace(f" {normalize_question(fund)} ", " ")
+        tokens = remaining.split()
+        if not _only(tokens, FOLLOW_UP_VOCABULARY):
+            return None
+
+        # 1. The metric, from the previous result or joined from its view
+        by_name = {column.lower(): column for column in columns}
+        source, metric = relation, None
+        found = self._find_metric(normalized)
+        if found is not None:
+            view, column = found
+            if column in by_name:
+                metric = f'"{by_name[column]}"'
+            elif "portfolioname" in by_name:
+                source = (f"(SELECT r.*, v.{column} FROM {relation} AS r "
+                          f"LEFT JOIN {view} AS v ON v.PortfolioName = r.\"{by_name['portfolioname']}\")")
+                metric = column
+            else:
+                return None
+
+        # 2. Filters
+        conditions, order = [], None
+        if fund is not None:
+            if "portfolioname" not in by_name:
+                return None
+            if funds is not None and fund.lower() not in {name.lower() for name in funds}:
+                # Not a filter of the earlier rows but the earlier question for another fund
+                return None
+            conditions.append(f'LOWER("{by_name["portfolioname"]}") = {_quote(fund.lower())}')
+        if metric is not None:
+            if "negative" in tokens or "losing" in tokens or "loss" in tokens:
+                conditions.append(f"{metric} < 0")
+                order = "ASC"
+            elif "positive" in tokens or "profitable" in tokens:
+                conditions.append(f"{metric} > 0")
+                order = "DESC"
+
+        # 3. Ordering
+        descending = "best" in tokens or "most" in tokens or "descending" in tokens
+        ascending = any(token in tokens for token in ("worst", "least", "fewest", "ascending"))
+        if descending != ascending:
+            order = "DESC" if descending else "ASC"
+        elif order is None and any(token in tokens for token in ("sort", "sorted", "order", "rank", "ranked")):
+            order = "DESC"
+        if order is not None and metric is None:
+            # "top 3 of those" keeps the previous order
+            if order != "DESC" or not TOP_N_PATTERN.search(normalized) or conditions:
+                return None
+            return self._follow_up(f"SELECT * FROM {relation} LIMIT {_top_n(normalized)}")
+        if not conditions and order is None:
+            return None
+
+        sql = f"SELECT * FROM {source}"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        if order is not None:
+            sql += f" ORDER BY {metric} {order}"
+            if TOP_N_PATTERN.search(normalized):
+                sql += f" LIMIT {_top_n(normalized)}"
+        return self._follow_up(sql)
+
+    def _follow_up(self, sql):
+        with self._lock:
+            self.lookups += 1
+            self.matches += 1
+            self.intent_counts["follow_up"] = self.intent_counts.get("follow_up", 0) + 1
+        return {"sql": sql, "error": None, "intent": "follow_up"}
+
+    def stats(self):
+        with self._lock:
+            return {
+                "lookups": self.lookups,
+                "matches": self.matches,
+                "match_rate": self.matches / self.lookups if self.lookups else 0.0,
+                "intents": dict(self.intent_counts),
+            }
+
+    def _match(self, lowered, normalized):
+        # The whole-database intents only apply when no fund is named and
+        # every word belongs to the intent; otherwise a filter would be lost
+        fund = self._find_fund(lowered)
+        tokens = normalized.split()
+
+        # 1. Data coverage / availability
+        if fund is None and COVERAGE_PATTERN.search(lowered) and _only(tokens, COVERAGE_VOCABULARY):
+            return "data_coverage", "SELECT * FROM v_data_coverage"
+
+        # 2. Security held by the most funds
+        if fund is None and MOST_HELD_PATTERN.search(normalized) and _only(tokens, MOST_HELD_VOCABULARY):
+            return "most_held_security", (
+                "SELECT SecName, num_funds_holding FROM v_security_summary "
+                "ORDER BY num_funds_holding DESC LIMIT 1"
+            )
+
+        metric = self._find_metric(normalized)
+        remaining = normalized
+        if fund is not None:
+            remaining = f" {normalized} ".replace(f" {normalize_question(fund)} ", " ")
+        tokens = remaining.split()
+        if not _only(tokens, FUND_VOCABULARY):
+            return None, None
+
+        # 3. A metric for one named fund
+        if fund is not None:
+            view, column = metric or ("v_fund_summary", "ytd_pl")
+            if metric is None and "pl" not in normalized.split():
+                return None, None
+            return "fund_metric", (
+                f"SELECT PortfolioName, {column} FROM {view} "
+                f"WHERE LOWER(PortfolioName) = {_quote(fund.lower())}"
+            )
+
+        if "fund" not in tokens:
+            return None, None
+
+        # 4. Funds with negative / positive P&L
+        # "performance" and bare "best fund" default to YTD P&L
+        if metric is None and ("pl" in tokens or "best" in tokens or "worst" in tokens):
+            metric = FUND_METRICS["ytd"]
+        if metric is not None and metric[0] == "v_fund_summary" and metric[1].endswith("_pl"):
+            if "negative" in tokens or "losing" in tokens or "loss" in tokens:
+                return "fund_sign_filter", (
+                    f"SELECT PortfolioName, {metric[1]} FROM v_fund_summary "
+                    f"WHERE {metric[1]} < 0 ORDER BY {metric[1]} ASC"
+                )
+            if "positive" in tokens or "profitable" in tokens:
+                return "fund_sign_filter", (
+                    f"SELECT PortfolioName, {metric[1]} FROM v_fund_summary "
+                    f"WHERE {metric[1]} > 0 ORDER BY {metric[1]} DESC"
+                )
+
+        # 5. Best / worst fund by a metric
+        descending = "best" in tokens or "most" in tokens
+        ascending = "worst" in tokens or "least" in tokens or "fewest" in tokens
+        if metric is not None and descending != ascending:
+            view, column = metric
+            order = "DESC" if descending else "ASC"
+            return "fund_ranking", (
+                f"SELECT PortfolioName, {column} FROM {view} "
+                f"ORDER BY {column} {order} LIMIT {_top_n(normalized)}"
+            )
+
+        return None, None
+
+    def _find_metric(self, normalized):
+        padded = f" {normalized} "
+        for keyword, target in FUND_METRICS.items():
+            if f" {keyword} " in padded:
+                return target
+        if " holding " in padded or " positions " in padded:
+            return FUND_METRICS["holdings"]
+        return None
+
+    def _find_fund(self, lowered):
+        for name in self.fund_names:
+            if re.search(rf"(?<![\w-]){re.escape(name.lower())}(?![\w-])", lowered):
+                return name
+        return None
+
+
+def _only(tokens, vocabulary):
+    return all(token in vocabulary or token.isdigit() for token in tokens)
+
+
+def _top_n(normalized):
+    match = TOP_N_PATTERN.search(normalized)
+    if not match:
+        return 1
+    return int(next(group for group in match.groups() if group and group.isdigit()))
+
+
+def _quote(value):
+    return "'" + value.replace("'", "''") + "'"
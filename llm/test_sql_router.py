@@ -0,0 +1,58 @@
+import pytest
+
+from llm.sql_router import SQLRouter
+
+FUNDS = ["Ytum", "Garfield", "Redfield Accu-Fund", "HoldCo 1"]
+
+
+@pytest.fixture
+def router():
+    return SQLRouter(FUNDS)
+
+
+@pytest.mark.parametrize("question, intent", [
+    ("What date range does the data cover?", "data_coverage"),
+    ("How many records are there?", "data_coverage"),
+    ("Which security is held by the most funds?", "most_held_security"),
+    ("What is the most widely held security?", "most_held_security"),
+    ("Which fund performed best this year?", "fund_ranking"),
+    ("What is the YTD P&L of Ytum?", "fund_metric"),
+])
+def test_routes_intent(router, question, intent):
+    result = router.route(question)
+    assert result is not None
+    assert result["intent"] == intent
+    assert result["error"] is None
+
+
+@pytest.mark.parametrize("question", [
+    # Whole-database intents that name a fund or ask for something else
+    "What is the latest date of trades for Ytum?",
+    "How many records does Garfield have?",
+    "Which security has the highest market value across all funds?",
+    "Which security had the best YTD P&L in any fund?",
+])
+def test_leaves_other_questions_to_the_llm(router, question):
+    assert router.route(question) is None
+
+
+def test_follow_up_filters_last_result(router):
+    result = router.route_follow_up(
+        "now only the ones with negative YTD", ["PortfolioName", "ytd_pl"]
+    )
+    assert result["intent"] == "follow_up"
+    assert result["sql"].startswith("SELECT * FROM last_result")
+    assert '"ytd_pl" < 0' in result["sql"]
+
+
+def test_follow_up_joins_a_missing_metric(router):
+    result = router.route_follow_up("sort those by YTD", ["PortfolioName", "MV_Base"])
+    assert "LEFT JOIN v_fund_summary" in result["sql"]
+    assert result["sql"].endswith("ORDER BY ytd_pl DESC")
+
+
+def test_follow_up_for_a_fund_not_in_last_result(router):
+    result = router.route_follow_up(
+        "what about Garfield", ["PortfolioName", "ytd_pl"], funds={"Ytum"}
+    )
+    assert result is None
@@ -0,0 +1,244 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+from core.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "Qwen/Qwen2.5-7B-Instruct"
+
+RETRY_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+LLM_RETRIES = REGISTRY.counter("llm_retries_total", "LLM calls retried after a transient error")
+LLM_HEDGES = REGISTRY.counter("llm_hedges_total", "Hedged duplicate LLM requests, by which one won", ["winner"])
+LLM_REJECTED = REGISTRY.counter("llm_rejected_total", "LLM calls rejected because the queue was full")
+
+
+class LLMOverloaded(Exception):
+    """Raised instead of queueing when too many LLM calls are already waiting."""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class LLMTransport:
+    """One set of HuggingFace clients shared by the SQL and answer generators.
+
+    - Connections: the clients are created once, so keep-alive connections
+      are reused by every call (the sync client uses huggingface_hub's
+      shared session, the async client its own pooled httpx client).
+    - Deadlines: each HTTP attempt is limited to `timeout` seconds and a call,
+      retries included, to `deadline` seconds.
+    - Retries: timeouts, connection errors and 408/429/5xx are retried up to
+      `retries` times with full-jitter exponential backoff.
+    - Hedging: with `hedge_after` set, an async call still running after that
+      many seconds gets a duplicate request and the first reply wins.
+    - Backpressure: at most `max_concurrency` calls run at once and
+      `max_queue` wait; beyond that LLMOverloaded is raised straight away,
+      as is waiting longer than `queue_timeout`.
+    """
+
+    def __init__(self, model_name, token=None, timeout=30, deadline=60, retries=2, backoff_base=0.5,
+                 backoff_max=4, hedge_after=None, max_concurrency=16, max_queue=64, queue_timeout=10):
+        # huggingface_hub is slow to import; loaded when a transport is built
+        from huggingface_hub import AsyncInferenceClient, InferenceClient
+
+        self.model_name = model_name
+        self.client = InferenceClient(model=model_name, token=token, timeout=timeout)
+        self.async_client = AsyncInferenceClient(model=model_name, token=token, timeout=timeout)
+        self.timeout = timeout
+        self.deadline = deadline
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_after = hedge_after
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self._lock = threading.Lock()
+        self._thread_slots = threading.BoundedSemaphore(max_concurrency)
+        self._async_slots = asyncio.Semaphore(max_concurrency)
+        self.active = 0
+        self.queued = 0
+        self.calls = 0
+        self.failures = 0
+        self.rejected = 0
+
+    # Sync
+
+    def chat_completion(self, messages, **kwargs):
+        with self._thread_slot():
+            return self._with_retries(lambda: self.client.chat_completion(messages=messages, **kwargs))
+
+    def _with_retries(self, func):
+        started = time.monotonic()
+        for attempt in range(self.retries + 1):
+            try:
+                return func()
+            except Exception as e:
+                delay = self._retry_delay(e, attempt, started)
+                if delay is None:
+                    self._failed()
+                    raise
+                time.sleep(delay)
+
+    # Async
+
+    async def chat_completion_async(self, messages, **kwargs):
+        async with self._async_slot():
+            return await asyncio.wait_for(
+                self._with_retries_async(lambda: self._hedged(messages, kwargs)),
+                timeout=self.deadline
+            )
+
+    async def stream_chat_completion(self, messages, **kwargs):
+        """Yield streamed chunks. Only opening the stream is retried; the
+        slot is held until the stream ends."""
+        async with self._async_slot():
+            stream = await asyncio.wait_for(
+                self._with_retries_async(
+                    lambda: self.async_client.chat_completion(messages=messages, stream=True, **kwargs)
+                ),
+                timeout=self.deadline
+            )
+            async for chunk in stream:
+                yield chunk
+
+    async def _with_retries_async(self, func):
+        started = time.monotonic()
+        for attempt in range(self.retries + 1):
+            try:
+                return await func()
+            except Exception as e:
+                delay = self._retry_delay(e, attempt, started)
+                if delay is None:
+                    self._failed()
+                    raise
+                await asyncio.sleep(delay)
+
+    async def _hedged(self, messages, kwargs):
+        primary = asyncio.ensure_future(self.async_client.chat_completion(messages=messages, **kwargs))
+        if not self.hedge_after:
+            return await primary
+        done, _ = await asyncio.wait({primary}, timeout=self.hedge_after)
+        if done:
+            return primary.result()
+
+        hedge = asyncio.ensure_future(self.async_client.chat_completion(messages=messages, **kwargs))
+        pending = {primary, hedge}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        LLM_HEDGES.inc(winner="primary" if task is primary else "hedge")
+                        return task.result()
+            # Both failed: report the primary's error
+            return primary.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    # Shared
+
+    def _retry_delay(self, error, attempt, started):
+        """Seconds to wait before retrying `error`, or None to give up."""
+        if attempt >= self.retries or not _is_retryable(error):
+            return None
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if time.monotonic() - started + delay >= self.deadline:
+            return None
+        LLM_RETRIES.inc()
+        logger.warning("LLM call failed (%s), retrying in %.2fs", error, delay)
+        return delay
+
+    def _failed(self):
+        with self._lock:
+            self.failures += 1
+
+    def _admit(self):
+        with self._lock:
+            self.calls += 1
+            if self.active >= self.max_concurrency and self.queued >= self.max_queue:
+                self.rejected += 1
+                LLM_REJECTED.inc()
+                raise LLMOverloaded(f"{self.queued} LLM calls already queued")
+            self.queued += 1
+
+    def _start(self):
+        with self._lock:
+            self.queued -= 1
+            self.active += 1
+
+    def _finish(self, started):
+        with self._lock:
+            if started:
+                self.active -= 1
+            else:
+                self.queued -= 1
+
+    @contextmanager
+    def _thread_slot(self):
+        self._admit()
+        if not self._thread_slots.acquire(timeout=self.queue_timeout):
+            self._finish(started=False)
+            self._reject_timeout()
+        self._start()
+        try:
+            yield
+        finally:
+            self._thread_slots.release()
+            self._finish(started=True)
+
+    @asynccontextmanager
+    async def _async_slot(self):
+        self._admit()
+        try:
+            await asyncio.wait_for(self._async_slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._finish(started=False)
+            self._reject_timeout()
+        except BaseException:
+            self._finish(started=False)
+            raise
+        self._start()
+        try:
+            yield
+        finally:
+            self._async_slots.release()
+            self._finish(started=True)
+
+    def _reject_timeout(self):
+        with self._lock:
+            self.rejected += 1
+        LLM_REJECTED.inc()
+        raise LLMOverloaded(f"No LLM slot free within {self.queue_timeout}s")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "active": self.active,
+                "queued": self.queued,
+                "max_concurrency": self.max_concurrency,
+                "max_queue": self.max_queue,
+                "calls": self.calls,
+                "failures": self.failures,
+                "rejected": self.rejected,
+            }
+
+
+def _is_retryable(error):
+    import httpx
+    from huggingface_hub.errors import HfHubHTTPError, InferenceTimeoutError
+
+    if isinstance(error, (InferenceTimeoutError, TimeoutError, asyncio.TimeoutError, httpx.TransportError)):
+        return True
+    if isinstance(error, HfHubHTTPError) and error.response is not None:
+        return error.response.status_code in RETRY_STATUS
+    return False
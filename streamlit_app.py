@@ -1,12 +1,15 @@
 import streamlit as st
 import pandas as pd
 import requests
-import time
+import json
+import uuid
 
 # ------------------------------
 # CONFIG
 # ------------------------------
-API_URL = "https://financialdatachatbot-1.onrender.com/ask"  # Change to Render URL after deploy
+API_BASE = "https://financialdatachatbot-1.onrender.com"  # Change to Render URL after deploy
+API_URL = f"{API_BASE}/ask"
+STREAM_URL = f"{API_URL}/stream"
 
 st.set_page_config(
     page_title="Financial Analytics Chatbot",
@@ -15,15 +18,32 @@ st.set_page_config(
 )
 
 # ------------------------------
-# LOAD KNOWLEDGE
+# KNOWLEDGE BASE (paged from the API)
 # ------------------------------
-@st.cache_data
-def load_data():
-    holdings = pd.read_csv("./data/processed/holdings_clean.csv")
-    trades = pd.read_csv("./data/processed/trades_clean.csv")
-    return holdings, trades
-
-holdings_df, trades_df = load_data()
+PAGE_SIZE = 100
+
+@st.cache_data(ttl=300, show_spinner=False)
+def fetch_page(table, offset, fund=""):
+    """One page of a table from /tables/{table}, plus the matching row count."""
+    params = {"limit": PAGE_SIZE, "offset": offset, "count": "true"}
+    if fund:
+        params["PortfolioName"] = fund
+    res = requests.get(f"{API_BASE}/tables/{table}", params=params, timeout=30)
+    res.raise_for_status()
+    page = res.json()
+    return pd.DataFrame(page["rows"], columns=page["columns"]), page["total"]
+
+def table_browser(table):
+    fund = st.text_input("Fund", key=f"{table}_fund", placeholder="All funds").strip()
+    page_number = st.number_input("Page", min_value=1, value=1, step=1, key=f"{table}_page")
+    try:
+        df, total = fetch_page(table, (page_number - 1) * PAGE_SIZE, fund)
+    except Exception as e:
+        st.error(f"Could not load {table}: {e}")
+        return
+    st.dataframe(df, height=400)
+    pages = max(1, -(-total // PAGE_SIZE))
+    st.caption(f"Rows: {total:,} • Page {page_number} of {pages:,}")
 
 # ------------------------------
 # SIDEBAR – KNOWLEDGE BASE
@@ -35,13 +55,26 @@ with st.sidebar:
 
     with tab1:
         st.caption("Holdings snapshot data")
-        st.dataframe(holdings_df, height=400)
-        st.caption(f"Rows: {len(holdings_df):,}")
+        table_browser("holdings")
 
     with tab2:
         st.caption("Trades transaction data")
-        st.dataframe(trades_df, height=400)
-        st.caption(f"Rows: {len(trades_df):,}")
+        table_browser("trades")
+
+# ------------------------------
+# SSE CLIENT
+# ------------------------------
+def stream_events(question, session_id=None):
+    """Yield (event, payload) pairs from the /ask/stream endpoint."""
+    payload = {"question": question, "session_id": session_id}
+    with requests.post(STREAM_URL, json=payload, stream=True, timeout=60) as res:
+        res.raise_for_status()
+        event = "message"
+        for line in res.iter_lines(decode_unicode=True):
+            if line.startswith("event:"):
+                event = line[len("event:"):].strip()
+            elif line.startswith("data:"):
+                yield event, json.loads(line[len("data:"):].strip())
 
 # ------------------------------
 # MAIN CHAT UI
@@ -51,6 +84,9 @@ st.caption("Ask questions about fund performance, trades, holdings, or securitie
 
 if "messages" not in st.session_state:
     st.session_state.messages = []
+# One API session per browser tab, so follow-ups can refer to earlier answers
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
 
 # Display chat history
 for msg in st.session_state.messages:
@@ -68,27 +104,29 @@ if prompt := st.chat_input("Ask a question..."):
 
     # Assistant placeholder
     with st.chat_message("assistant"):
+        status_placeholder = st.empty()
         response_placeholder = st.empty()
         full_response = ""
 
         try:
-            # Call FastAPI
-            res = requests.post(
-                API_URL,
-                json={"question": prompt},
-                timeout=60
-            )
-            print(res)
-            res.raise_for_status()
-            answer = res.json()["answer"]
-
-            # Simulated streaming effect
-            for token in answer.split(" "):
-                full_response += token + " "
-                response_placeholder.markdown(full_response)
-                time.sleep(0.02)
+            # Render server-sent events as they arrive
+            for event, payload in stream_events(prompt, st.session_state.session_id):
+                if event == "sql":
+                    status_placeholder.caption("Query generated, fetching data...")
+                elif event == "query":
+                    status_placeholder.caption("Data fetched, writing answer...")
+                elif event == "token":
+                    full_response += payload["text"]
+                    response_placeholder.markdown(full_response)
+                elif event == "done":
+                    full_response = payload["answer"]
+                    response_placeholder.markdown(full_response)
+                elif event == "error":
+                    raise RuntimeError(payload["detail"])
+            status_placeholder.empty()
 
         except Exception as e:
+            status_placeholder.empty()
             full_response = f"❌ Error: {str(e)}"
             response_placeholder.markdown(full_response)
 